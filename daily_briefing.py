@@ -1,21 +1,26 @@
 import os
 import io
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timedelta, timezone
 import pytz
 from dotenv import load_dotenv
 import json
-import re
+import hashlib
+import functools
+import time
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing_extensions import TypedDict
 
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image as PlatypusImage, PageBreak
 from reportlab.lib.enums import TA_JUSTIFY, TA_CENTER, TA_LEFT
 
 # Map JSON keys to Display Names
@@ -29,7 +34,6 @@ REGION_MAP = {
     "sea": "해상 (Marine)"
 }
 
-import google.generativeai as genai
 from PIL import Image
 
 # ====== Environment Configuration ======
@@ -37,35 +41,42 @@ load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 DISCORD_WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL")
 
-# Configure Gemini API
-genai.configure(api_key=GEMINI_API_KEY)
-# Free version (High rate limits, standard performance)
-model = genai.GenerativeModel('gemini-2.5-pro')
-
 KST = pytz.timezone("Asia/Seoul")
 
+# The charts come from the same host and are pure network I/O,
+# so they are fetched in parallel instead of one after another.
+# At most 5 requests are in flight so weather.go.kr does not start
+# throttling a burst of connections from one client.
+MAX_DOWNLOAD_WORKERS = 5
+
+# Files API uploads go to a different host (Google, not KMA), so they get
+# their own pool size instead of borrowing the KMA throttling limit.
+MAX_UPLOAD_WORKERS = 4
+
+# One shared session for every HTTP call (KMA, Discord) so
+# connections are kept alive and reused instead of paying a new
+# TCP/TLS handshake per request.
+# Transient KMA errors (throttling, gateway errors) are retried with
+# backoff; POSTs are not retried, so a Discord upload is never sent twice.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=MAX_DOWNLOAD_WORKERS,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]),
+))
+
 # ====== [IMPORTANT] Korean Font Configuration ======
 # ReportLab’s default fonts (e.g., Helvetica) do not support Korean characters.
 # Therefore, a Korean font must be specified.
-KOREAN_FONT_URL = "https://github.com/google/fonts/raw/main/ofl/nanumgothic/NanumGothic-Regular.ttf"
-KOREAN_FONT_PATH = "NanumGothic.ttf"
+# NanumGothic.ttf ships with the repository, so nothing is downloaded;
+# ReportLab embeds only the glyphs actually used (font subsetting).
+KOREAN_FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "NanumGothic.ttf")
 FONT_NAME = "NanumGothic"
 
 def register_korean_font():
-    # 1. Check if font exists locally
-    if not os.path.exists(KOREAN_FONT_PATH):
-        print("Downloading Korean font (NanumGothic)...")
-        try:
-            resp = requests.get(KOREAN_FONT_URL, timeout=10)
-            resp.raise_for_status()
-            with open(KOREAN_FONT_PATH, "wb") as f:
-                f.write(resp.content)
-            print("Font downloaded successfully.")
-        except Exception as e:
-            print(f"Failed to download font: {e}")
-            return False
-
-    # 2. Register the font with ReportLab
+    # Already registered (e.g. by another module in the same process)
+    if FONT_NAME in pdfmetrics.getRegisteredFontNames():
+        return True
     try:
         pdfmetrics.registerFont(TTFont(FONT_NAME, KOREAN_FONT_PATH))
         return True
@@ -73,8 +84,10 @@ def register_korean_font():
         print(f"Font registration failed: {e}")
         return False
 
-# Run registration
-HAS_KOREAN_FONT = register_korean_font()
+# Registration runs on first PDF build, not at import time
+@functools.lru_cache(maxsize=1)
+def ensure_korean_font():
+    return register_korean_font()
 
 # ----- 1) Generate date strings using today's 00 UTC as the base time -----
 def get_base_time_strings():
@@ -128,33 +141,182 @@ def build_kma_urls(ymd, hhh):
 
 
 # ----- 3) Download chart images -----
+# KMA images never change once published and the URL already contains
+# the base time, so a downloaded chart can be reused by later runs
+# (retries, PDF regeneration). Old days can be pruned by mtime.
+CACHE_DIR = "cache"
+# Chart URLs carry the base time, so older entries are never hit again
+CACHE_MAX_AGE_HOURS = 48
+
+def purge_image_cache(max_age_hours=CACHE_MAX_AGE_HOURS):
+    """
+    Remove cached charts (and leftover partial downloads)
+    older than `max_age_hours`.
+    """
+    if not os.path.isdir(CACHE_DIR):
+        return
+    cutoff = time.time() - max_age_hours * 3600
+    for entry in os.scandir(CACHE_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError as e:
+            print(f"Failed to purge cached image: {e}")
+
 def fetch_image(url, timeout=120):
+    """
+    Download `url` into the image cache and return the cached file path.
+    The body is streamed to disk, so no chart is held in memory here;
+    consumers open the file when they need it.
+    """
+    cache_path = os.path.join(CACHE_DIR, hashlib.sha1(url.encode()).hexdigest() + ".png")
+    if os.path.exists(cache_path):
+        return cache_path
+
     try:
-        resp = requests.get(url, timeout=timeout)
-        if resp.status_code == 200:
-            return io.BytesIO(resp.content)
-        else:
-            return None
+        # Stream the response so that a chart which is not published yet
+        # (an error status or an HTML error page) is rejected from the
+        # headers alone, without downloading the body.
+        with SESSION.get(url, timeout=timeout, stream=True) as resp:
+            if resp.status_code != 200 or not resp.headers.get("Content-Type", "").startswith("image/"):
+                return None
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            # Write to a temporary file first so an interrupted download
+            # never leaves a truncated chart in the cache.
+            fd, tmp_path = tempfile.mkstemp(suffix=".part", dir=CACHE_DIR)
+            try:
+                resp.raw.decode_content = True
+                with os.fdopen(fd, "wb") as f:
+                    shutil.copyfileobj(resp.raw, f)
+                os.replace(tmp_path, cache_path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        return cache_path
     except Exception:
         return None
 
 
+def download_images(urls, steps=None):
+    """
+    Download the charts concurrently.
+    Only the forecast step indices in `steps` are fetched (all when None).
+    Returns a dict with the same layout as `urls`
+    (cached file path or None for each entry; None for skipped steps).
+    """
+    with ThreadPoolExecutor(max_workers=MAX_DOWNLOAD_WORKERS) as ex:
+        wv = ex.submit(fetch_image, urls["wv"])
+        charts = {
+            key: [
+                ex.submit(fetch_image, u) if steps is None or idx in steps else None
+                for idx, u in enumerate(urls[key])
+            ]
+            for key in ("surface", "gph500", "wnd850")
+        }
+        return {
+            "wv": wv.result(),
+            **{key: [f.result() if f else None for f in futures] for key, futures in charts.items()},
+        }
+
+
 # ----- 4) Generate Korean weather briefing using Gemini (multimodal analysis) -----
-def generate_briefing_text(base_utc, images_dict):
+LLM_CACHE_DIR = "llm_cache"
+
+def purge_llm_cache(max_age_hours=CACHE_MAX_AGE_HOURS):
     """
-    Send chart images directly to Gemini for multimodal analysis.
-    The model analyzes the meteorological charts and generates
-    a structured weather briefing.
+    Remove cached briefings older than `max_age_hours`
+    (the Files API manifest is kept).
     """
-    valid_str = base_utc.strftime("%Y.%m.%d.%H UTC")
-    kst_str = (base_utc + timedelta(hours=9)).strftime("%Y-%m-%d %H시")
+    if not os.path.isdir(LLM_CACHE_DIR):
+        return
+    cutoff = time.time() - max_age_hours * 3600
+    for entry in os.scandir(LLM_CACHE_DIR):
+        if not entry.name.endswith(".txt"):
+            continue
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError as e:
+            print(f"Failed to purge cached briefing: {e}")
+
+# The Gemini SDK is heavy to import, so it is only loaded
+# (and configured) once a briefing is actually requested.
+@functools.lru_cache(maxsize=1)
+def get_model():
+    import google.generativeai as genai
+
+    genai.configure(api_key=GEMINI_API_KEY)
+    # Free version (High rate limits, standard performance)
+    return genai.GenerativeModel('gemini-2.5-pro')
+
+# Charts uploaded through the Gemini Files API stay available for ~48h.
+# The manifest maps the SHA-256 of each chart to its uploaded file so a
+# rerun sends a short file reference instead of the PNG bytes again.
+GEMINI_FILES_MANIFEST = os.path.join(LLM_CACHE_DIR, "gemini_files.json")
+
+def load_files_manifest():
+    """
+    Load the uploaded-file manifest, dropping files the Files API
+    has already deleted so the manifest does not grow day after day.
+    """
+    try:
+        with open(GEMINI_FILES_MANIFEST, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    now = time.time()
+    return {digest: entry for digest, entry in manifest.items() if entry["expires"] > now}
+
+def save_files_manifest(manifest):
+    try:
+        os.makedirs(LLM_CACHE_DIR, exist_ok=True)
+        with open(GEMINI_FILES_MANIFEST, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+    except OSError as e:
+        print(f"Failed to save Gemini files manifest: {e}")
+
+# Gemini tiles images at 768x768 (258 tokens per tile), so charts are
+# shrunk to fit a single tile before they are sent.
+LLM_IMAGE_MAX_PX = 768
 
-    prompt_text = f"""
+def llm_image_part(path, palette=False):
+    """
+    Build an inline PNG part for Gemini from the cached chart at `path`,
+    downscaled to one tile. The synoptic charts are line art, so with
+    `palette` they are quantized to 64 colours, which keeps them legible
+    at a fraction of the size. The full-size original is kept for the PDF.
+    """
+    img = Image.open(path)
+    img.thumbnail((LLM_IMAGE_MAX_PX, LLM_IMAGE_MAX_PX), Image.LANCZOS)
+    if palette:
+        img = img.convert("RGB").convert("P", palette=Image.ADAPTIVE, colors=64)
+    out = io.BytesIO()
+    img.save(out, format="PNG", optimize=True)
+    return {"mime_type": "image/png", "data": out.getvalue()}
+
+def upload_image_part(part, manifest):
+    """
+    Replace an inline image part with a Files API reference,
+    reusing an earlier upload of the same bytes while it is still valid.
+    """
+    import google.generativeai as genai
+
+    digest = hashlib.sha256(part["data"]).hexdigest()
+    entry = manifest.get(digest)
+    # Keep a one-hour margin so the file does not expire mid-request
+    if not entry or entry["expires"] < time.time() + 3600:
+        file_obj = genai.upload_file(io.BytesIO(part["data"]), mime_type=part["mime_type"])
+        entry = {"uri": file_obj.uri, "expires": file_obj.expiration_time.timestamp()}
+        manifest[digest] = entry
+    return {"file_data": {"mime_type": part["mime_type"], "file_uri": entry["uri"]}}
+
+# Static instructions come first and the per-run Valid time is appended
+# after them, so every run sends an identical prompt prefix that Gemini
+# can serve from its implicit prompt cache.
+STATIC_PROMPT = """
 당신은 한국 기상청 수석 예보관입니다.
 첨부된 위성영상(WV), 지상일기도(Surface), 500hPa, 850hPa 차트를 분석하여 일일 브리핑을 작성하세요.
 
-Valid 시간: {valid_str} (KST: {kst_str})
-
 아래 포맷에 맞춰 **한국어**로 작성해 주세요.
 기상학적 전문 용어를 사용하되, 논리적 근거(Reasoning)를 명확히 하세요.
 
@@ -168,37 +330,91 @@ Valid 시간: {valid_str} (KST: {kst_str})
 * 지상, 500hPa (와도), 850hPa (바람) 차트는 각각 0h, 24h, 48h 예측장입니다. 시계열 변화를 분석에 반영하세요.
 **반드시 아래 JSON 포맷으로만 응답하세요.** (Markdown이나 기타 텍스트 금지)
 
-{{
+{
   "title": "한반도 일일 기상 브리핑",
   "synoptic_overview": "종관 개황 내용...",
   "key_features_24h": "24시간 예측 주요 특징...",
   "key_features_48h": "48시간 예측 주요 특징...",
-  "sensible_weather": {{
+  "sensible_weather": {
       "seoul_metro": "수도권 날씨...",
       "gangwon": "강원도 날씨...",
       "chungcheong": "충청권...",
       "jeolla": "전라권...",
       "gyeongsang": "경상권...",
-      "jeju": "제주도..."
-  }},
+      "jeju": "제주도...",
+      "sea": "해상..."
+  },
   "hazards": ["위험기상요소1 주요 특징...", "위험기상요소2 주요 특징..."],
   "uncertainties": "주요 불확실성...",
   "summary": "내부 브리핑 요약 (3줄)"
-}}
+}
 """
-    contents = [prompt_text]
 
-    # Helper: BytesIO -> PIL Image
-    def bytes_to_pil(b_io):
-        if b_io is None: return None
-        b_io.seek(0)
-        img = Image.open(b_io)
-        return img
+# Response schema for the briefing. With response_mime_type set to JSON,
+# Gemini returns exactly this object, with no Markdown fences around it.
+# (typing_extensions.TypedDict: the SDK rejects typing.TypedDict before 3.12)
+class SensibleWeather(TypedDict):
+    seoul_metro: str
+    gangwon: str
+    chungcheong: str
+    jeolla: str
+    gyeongsang: str
+    jeju: str
+    sea: str
+
+class Briefing(TypedDict):
+    title: str
+    synoptic_overview: str
+    key_features_24h: str
+    key_features_48h: str
+    sensible_weather: SensibleWeather
+    hazards: list[str]
+    uncertainties: str
+    summary: str
+
+BRIEFING_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": Briefing,
+}
+
+# Upper bound for the Gemini call. Past this the run ships the PDF with
+# a placeholder briefing instead of waiting on a stalled request.
+GEMINI_TIMEOUT_SECONDS = 180
+
+def fallback_briefing(reason):
+    """
+    Minimal briefing JSON (same keys as Briefing) used when Gemini
+    does not answer, so the PDF with the charts is still produced.
+    """
+    return json.dumps({
+        "title": "한반도 일일 기상 브리핑",
+        "synoptic_overview": "분석 지연",
+        "key_features_24h": "분석 지연",
+        "key_features_48h": "분석 지연",
+        "sensible_weather": {},
+        "hazards": [],
+        "uncertainties": "-",
+        "summary": f"Gemini 분석을 받지 못했습니다. 차트만 첨부합니다. ({reason})",
+    }, ensure_ascii=False)
+
+def generate_briefing_text(base_utc, images_dict):
+    """
+    Send chart images directly to Gemini for multimodal analysis.
+    The model analyzes the meteorological charts and generates
+    a structured weather briefing.
+    """
+    valid_str = base_utc.strftime("%Y.%m.%d.%H UTC")
+    kst_str = (base_utc + timedelta(hours=9)).strftime("%Y-%m-%d %H시")
+
+    contents = [STATIC_PROMPT, f"Valid 시간: {valid_str} (KST: {kst_str})"]
+
+    def add_image(label, path, palette=True):
+        contents.append(label)
+        contents.append(llm_image_part(path, palette))
 
-    # 1. Add satellite imagery
+    # 1. Add satellite imagery (continuous tone, so no palette)
     if images_dict.get("wv"):
-        contents.append("=== [이미지] GK2A 위성 영상 (수증기) ===")
-        contents.append(bytes_to_pil(images_dict["wv"]))
+        add_image("=== [이미지] GK2A 위성 영상 (수증기) ===", images_dict["wv"], palette=False)
 
     # 2. Send only key forecast steps (0h, 24h, 48h) to Gemini
     #    to reduce token usage while preserving essential information.
@@ -209,156 +425,134 @@ Valid 시간: {valid_str} (KST: {kst_str})
     for idx, label in zip(target_indices, time_labels):
         # Surface
         if images_dict["surface"][idx]:
-            contents.append(f"=== [이미지] Surface Chart {label} ===")
-            contents.append(bytes_to_pil(images_dict["surface"][idx]))
+            add_image(f"=== [이미지] Surface Chart {label} ===", images_dict["surface"][idx])
         
         # 500hPa
         if images_dict["gph500"][idx]:
-            contents.append(f"=== [이미지] 500hPa Chart {label} ===")
-            contents.append(bytes_to_pil(images_dict["gph500"][idx]))
+            add_image(f"=== [이미지] 500hPa Chart {label} ===", images_dict["gph500"][idx])
 
         # 850hPa
         if images_dict["wnd850"][idx]:
-            contents.append(f"=== [이미지] 850hPa Chart {label} ===")
-            contents.append(bytes_to_pil(images_dict["wnd850"][idx]))            
-
-    # After the image is processed, the BytesIO pointer may be at the end.
-    # Resetting the pointer (seek(0)) may be required before reusing the image
-    # when generating the PDF.
-
-    print(contents)
-    try:
-        response = model.generate_content(contents)
-        return response.text
-    except Exception as e:
-        return f"generation failed: {str(e)}"
-
-
-# ----- 5) Generate a single-column PDF report using ReportLab -----
-def build_pdf(base_utc, urls, images, briefing_text) -> bytes:
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-
-    margin_x = 20 * mm
-    margin_y = 20 * mm
-    usable_width = width - 2 * margin_x
-
-    title_font = FONT_NAME if HAS_KOREAN_FONT else "Helvetica-Bold"
-    body_font = FONT_NAME if HAS_KOREAN_FONT else "Helvetica"
-
-    # 1. Cover Page
-    c.setFont(title_font, 18)
-    c.drawString(margin_x, height - margin_y - 10 * mm, "Daily Briefing – Korea Peninsula")
-    c.setFont(body_font, 12)
-    c.drawString(
-        margin_x,
-        height - margin_y - 20 * mm,
-        f"Valid: {base_utc.strftime('%Y-%m-%d %H UTC')} (KST {(base_utc + timedelta(hours=9)).strftime('%Y-%m-%d %H시')})"
-    )
-    c.showPage()
-
-    # 2. Image Pages
-    def draw_image_page(title, img_io, caption):
-        if img_io: img_io.seek(0) # Reset pointer
-        c.setFont(title_font, 14)
-        c.drawString(margin_x, height - margin_y - 10 * mm, title)
-
-        if img_io is not None:
-            img = ImageReader(img_io)
-            max_w = usable_width
-            max_h = height - 60 * mm
-            iw, ih = img.getSize()
-            scale = min(max_w / iw, max_h / ih)
-            iw_scaled = iw * scale
-            ih_scaled = ih * scale
-
-            x = margin_x
-            y = (height - margin_y - 20 * mm) - ih_scaled
-            c.drawImage(img, x, y, iw_scaled, ih_scaled, preserveAspectRatio=True, anchor='sw')
-            text_y = y - 10 * mm
+            add_image(f"=== [이미지] 850hPa Chart {label} ===", images_dict["wnd850"][idx])
+
+    # The same prompt with the same charts gives the same briefing
+    # (e.g. a retried run on the same base time), so reuse the stored answer.
+    key = hashlib.sha256()
+    for part in contents:
+        if isinstance(part, str):
+            key.update(part.encode())
         else:
-            text_y = height - margin_y - 20 * mm
-            c.setFont(body_font, 11)
-            c.drawString(margin_x, text_y, "(이미지 로드 실패)")
+            key.update(hashlib.sha256(part["data"]).digest())
+    cache_path = os.path.join(LLM_CACHE_DIR, key.hexdigest() + ".txt")
 
-        c.setFont(body_font, 10)
-        c.drawString(margin_x, text_y - 5 * mm, caption)
-        c.showPage()
+    if os.path.exists(cache_path):
+        print(f"Using cached briefing: {cache_path}")
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return f.read()
 
-    # Draw all images
-    draw_image_page("GK2A WV 06.3μm", images.get("wv"), urls["wv"])
+    print([part if isinstance(part, str) else f"<{part['mime_type']}, {len(part['data'])} bytes>" for part in contents])
+    model = get_model()
 
-    for idx, step_label in zip([0, 2, 4], ["0h", "24h", "48h"]):
-        draw_image_page(f"Surface {step_label}", images["surface"][idx], urls["surface"][idx])
-    
-    for idx, step_label in zip([0, 2, 4], ["0h", "24h", "48h"]):
-        draw_image_page(f"500 hPa {step_label}", images["gph500"][idx], urls["gph500"][idx])
+    # Upload the charts once through the Files API and reference them;
+    # fall back to sending the bytes inline if an upload fails.
+    manifest = load_files_manifest()
 
-    for idx, step_label in zip([0, 2, 4], ["0h", "24h", "48h"]):
-        draw_image_page(f"850 hPa {step_label}", images["wnd850"][idx], urls["wnd850"][idx])
+    def to_request_part(part):
+        if isinstance(part, str):
+            return part
+        try:
+            return upload_image_part(part, manifest)
+        except Exception as e:
+            print(f"File upload failed, sending image inline: {e}")
+            return part
 
-    # === [CRITICAL FIX] ===
-    c.save()  # <--- This was missing! It finalizes the PDF file in the buffer.
-    # ======================
+    with ThreadPoolExecutor(max_workers=MAX_UPLOAD_WORKERS) as ex:
+        request = list(ex.map(to_request_part, contents))
+    save_files_manifest(manifest)
 
-    # 3. Text PDF Generation
-    buffer2 = io.BytesIO()
-    doc = SimpleDocTemplate(buffer2, pagesize=A4,
-                            leftMargin=margin_x, rightMargin=margin_x,
-                            topMargin=margin_y, bottomMargin=margin_y)
-    styles = getSampleStyleSheet()
-    style_korean = ParagraphStyle(
-        name='KoreanNormal',
-        parent=styles['Normal'],
-        fontName=body_font,
-        fontSize=10,
-        leading=16
-    )
+    try:
+        response = model.generate_content(
+            request,
+            generation_config=BRIEFING_GENERATION_CONFIG,
+            request_options={"timeout": GEMINI_TIMEOUT_SECONDS},
+        )
+        text = response.text
+    except Exception as e:
+        print(f"Gemini generation failed: {e}")
+        # Not cached, so the next run asks Gemini again
+        return fallback_briefing(e)
 
-    story = []
-    if not HAS_KOREAN_FONT:
-        story.append(Paragraph("[Warning: Korean font not found. Text may appear broken.]", styles["Normal"]))
+    # A truncated or malformed answer is not cached, so a retry asks again
+    if not clean_parse_json(text):
+        return text
+    try:
+        os.makedirs(LLM_CACHE_DIR, exist_ok=True)
+        with open(cache_path, "w", encoding="utf-8") as f:
+            f.write(text)
+    except Exception as e:
+        print(f"Failed to cache briefing: {e}")
+    return text
 
-    for line in briefing_text.split("\n"):
-        line = line.strip()
-        if line == "":
-            story.append(Spacer(1, 4 * mm))
-        else:
-            clean_line = line.replace("**", "") 
-            story.append(Paragraph(clean_line, style_korean))
-            story.append(Spacer(1, 1 * mm))
 
-    doc.build(story)
+# ----- 5) Downscale charts for the PDF report -----
+# Charts are drawn at most ~170 mm wide, so pixels beyond this
+# only inflate the PDF and slow down drawImage compression.
+PDF_IMAGE_MAX_PX = 1200
 
-    # 4. Merge PDFs
-    from PyPDF2 import PdfReader, PdfWriter
-    buffer.seek(0)  # Go to start of the image PDF
-    
-    writer = PdfWriter()
-    
-    # Read Image PDF (now it has content)
-    reader_main = PdfReader(io.BytesIO(buffer.getvalue()))
-    for page in reader_main.pages: writer.add_page(page)
+def shrink_image(path, max_px=PDF_IMAGE_MAX_PX):
+    """
+    Return a downscaled BytesIO copy of the chart at `path` for PDF embedding.
+    JPEG (quality 85) is several times smaller for continuous-tone imagery
+    such as the satellite picture, while PNG stays smaller for line-art
+    charts, so both are encoded and the smaller one is kept.
+    The cached original is left untouched (it is also sent to Gemini).
+    """
+    img = Image.open(path)
+    img.thumbnail((max_px, max_px), Image.LANCZOS)
 
-    # Read Text PDF
-    reader_text = PdfReader(io.BytesIO(buffer2.getvalue()))
-    for page in reader_text.pages: writer.add_page(page)
+    # JPEG has no alpha channel: flatten any transparency onto white.
+    rgba = img.convert("RGBA")
+    img = Image.new("RGB", rgba.size, "white")
+    img.paste(rgba, mask=rgba)
 
-    final_buffer = io.BytesIO()
-    writer.write(final_buffer)
-    final_buffer.seek(0)
+    png = io.BytesIO()
+    img.save(png, format="PNG")
+    jpeg = io.BytesIO()
+    img.save(jpeg, format="JPEG", quality=85, optimize=True, progressive=True)
 
-    # --- [NEW] Save to local file ---
-    local_filename = f"Weather_Briefing_{ymd}_{hhh}.pdf"
-    with open(local_filename, "wb") as f:
-        f.write(final_buffer.read())
+    out = min(png, jpeg, key=lambda b: b.getbuffer().nbytes)
+    out.seek(0)
+    return out
 
-    return final_buffer.read()
+# Forecast steps shown in the PDF: 0h, 24h, 48h
+PDF_STEP_INDICES = (0, 2, 4)
 
+def shrink_images(images):
+    """
+    Downscale every chart shown in the PDF in parallel.
+    Pillow releases the GIL while decoding, resampling and encoding,
+    so a thread pool spreads the work over all cores.
+    Returns the same layout as `images`; steps not shown in the PDF are None.
+    """
+    def shrink(path):
+        return shrink_image(path) if path else None
+
+    with ThreadPoolExecutor() as ex:
+        wv = ex.submit(shrink, images.get("wv"))
+        charts = {
+            key: [
+                ex.submit(shrink, path) if idx in PDF_STEP_INDICES else None
+                for idx, path in enumerate(images[key])
+            ]
+            for key in ("surface", "gph500", "wnd850")
+        }
+        return {
+            "wv": wv.result(),
+            **{key: [f.result() if f else None for f in futures] for key, futures in charts.items()},
+        }
 
 # ----- 6) Upload the generated PDF to Discord -----
-def post_to_discord(pdf_bytes, base_utc, data):
+def post_to_discord(pdf_path, base_utc, data):
     if not DISCORD_WEBHOOK_URL:
         print("Discord Webhook URL not set. Skipping upload.")
         return
@@ -371,35 +565,29 @@ def post_to_discord(pdf_bytes, base_utc, data):
         f"[Summary] {data.get('summary', '')}"        
     )
 
-    files = {
-        "file": (filename, pdf_bytes, "application/pdf")
-    }
     data = {
         "content": content
     }
     
     try:
-        resp = requests.post(DISCORD_WEBHOOK_URL, data=data, files=files)
+        # The PDF bytes are only read here at upload time, not kept for the whole run
+        with open(pdf_path, "rb") as fh:
+            files = {
+                "file": (filename, fh, "application/pdf")
+            }
+            resp = SESSION.post(DISCORD_WEBHOOK_URL, data=data, files=files)
         resp.raise_for_status()
         print("Done: PDF sent to Discord.")
     except Exception as e:
         print(f"Failed to upload to Discord: {e}")
 
-def build_stylish_pdf(base_utc, urls, images, data) -> bytes:
-    buffer = io.BytesIO()
-    
-    # 1. Setup Document
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        leftMargin=15*mm, rightMargin=15*mm,
-        topMargin=15*mm, bottomMargin=15*mm
-    )
-
-    # 2. Define Custom Styles
+# The briefing styles only depend on whether the Korean font is available,
+# so they are built once per process instead of on every PDF build.
+@functools.lru_cache(maxsize=None)
+def get_briefing_styles(has_korean_font):
     styles = getSampleStyleSheet()
-    font_main = FONT_NAME if HAS_KOREAN_FONT else "Helvetica"
-    font_bold = FONT_NAME if HAS_KOREAN_FONT else "Helvetica-Bold"
+    font_main = FONT_NAME if has_korean_font else "Helvetica"
+    font_bold = FONT_NAME if has_korean_font else "Helvetica-Bold"
 
     # Title Style
     style_title = ParagraphStyle(
@@ -430,20 +618,58 @@ def build_stylish_pdf(base_utc, urls, images, data) -> bytes:
         alignment=TA_JUSTIFY, spaceAfter=5
     )
 
-    # Hazard/Warning Style
-    style_warning = ParagraphStyle(
-        'WarningText', parent=styles['Normal'],
-        fontName=font_bold, fontSize=10, leading=15,
-        textColor=colors.darkblue
-    )
-
     # Summary Box Style
     style_summary_box = ParagraphStyle(
         'SummaryText', parent=style_body,
         fontSize=11, leading=16, textColor=colors.black
     )
 
-    style_warn = ParagraphStyle('Warn', parent=styles['Normal'], textColor=colors.firebrick)    
+    return {
+        "title": style_title,
+        "meta": style_meta,
+        "h2": style_h2,
+        "body": style_body,
+        "summary_box": style_summary_box,
+    }
+
+# Table styles shared by every image grid and label/description table
+IMAGE_TABLE_STYLE = [
+    ('ALIGN', (0,0), (-1,-1), 'CENTER'),
+    ('VALIGN', (0,0), (-1,-1), 'TOP'),
+    ('LEFTPADDING', (0,0), (-1,-1), 2),
+    ('RIGHTPADDING', (0,0), (-1,-1), 2),
+    ('BOTTOMPADDING', (0,0), (-1,-1), 5),
+]
+
+LABELED_TABLE_STYLE = [
+    ('GRID', (0,0), (-1,-1), 0.5, colors.lightgrey),
+    ('BACKGROUND', (0,0), (0,-1), colors.whitesmoke), # Shade the label column
+    ('VALIGN', (0,0), (-1,-1), 'TOP'),
+    ('PADDING', (0,0), (-1,-1), 6),
+]
+
+# `images` is the output of shrink_images() (charts already downscaled).
+# The document is written straight to `output_path`.
+def build_stylish_pdf(base_utc, urls, images, data, output_path) -> str:
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image as PlatypusImage
+
+    has_korean_font = ensure_korean_font()
+    
+    # 1. Setup Document
+    doc = SimpleDocTemplate(
+        output_path,
+        pagesize=A4,
+        leftMargin=15*mm, rightMargin=15*mm,
+        topMargin=15*mm, bottomMargin=15*mm
+    )
+
+    # 2. Define Custom Styles
+    styles = get_briefing_styles(has_korean_font)
+    style_title = styles["title"]
+    style_meta = styles["meta"]
+    style_h2 = styles["h2"]
+    style_body = styles["body"]
+    style_summary_box = styles["summary_box"]
 
     story = []
 
@@ -476,42 +702,30 @@ def build_stylish_pdf(base_utc, urls, images, data) -> bytes:
 
     # ================= IMAGES (GRID) =================
     # Layout: Satellite (Left) | Surface 0h (Right)
-    #         Surface 24h (Left) | 500hPa 24h (Right)
-    
-    img_list = []
+    #         500hPa 0h (Left) | 850hPa 0h (Right)
     
     # Helper to resize images for the grid
     def prep_img(img_io, width=85*mm, height=85*mm):
         if img_io:
-            img_io.seek(0)
             img = PlatypusImage(img_io, width=width, height=height)
             img.hAlign = 'CENTER'
             return img
         return Paragraph("(No Image)", style_meta)
 
-    # Row 1: Satellite & Surface 00h
-    row1 = [
-        [prep_img(images['wv']), prep_img(images['surface'][0])],
-        [Paragraph("GK2A Satellite (WV)", style_meta), Paragraph("Surface Analysis (00h)", style_meta)]
-    ]
-    
-    # Row 2: 500hPa 00h & 850hPa 00h
-    row2 = [
-        [prep_img(images['gph500'][0]), prep_img(images['wnd850'][0])],
-        [Paragraph("500hPa Analysis (00h)", style_meta), Paragraph("850hPa Analysis (00h)", style_meta)]
-    ]
-
-    # Build Image Table
-    img_table_data = row1 + row2
-    t_img = Table(img_table_data, colWidths=[90*mm, 90*mm])
-    t_img.setStyle(TableStyle([
-        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-        ('VALIGN', (0,0), (-1,-1), 'TOP'),
-        ('LEFTPADDING', (0,0), (-1,-1), 2),
-        ('RIGHTPADDING', (0,0), (-1,-1), 2),
-        ('BOTTOMPADDING', (0,0), (-1,-1), 5),
-    ]))
-    story.append(t_img)
+    # Helper: rows of (image, caption) pairs -> two-column image table
+    def image_table(*rows):
+        table_data = []
+        for row in rows:
+            table_data.append([prep_img(img_io) for img_io, _ in row])
+            table_data.append([Paragraph(caption, style_meta) for _, caption in row])
+        t_img = Table(table_data, colWidths=[90*mm, 90*mm])
+        t_img.setStyle(IMAGE_TABLE_STYLE)
+        return t_img
+
+    story.append(image_table(
+        [(images['wv'], "GK2A Satellite (WV)"), (images['surface'][0], "Surface Analysis (00h)")],
+        [(images['gph500'][0], "500hPa Analysis (00h)"), (images['wnd850'][0], "850hPa Analysis (00h)")],
+    ))
     
     #story.append(PageBreak()) # Move text to next page for cleanliness
 
@@ -520,47 +734,17 @@ def build_stylish_pdf(base_utc, urls, images, data) -> bytes:
 
     #story.append(Spacer(1, 3*mm))
     #story.append(Paragraph(f"<b>[24-48h Outlook]</b> {data.get('key_features_24_48h', '-')}", style_body))
-    story.append(Spacer(1, 3*mm))
-    story.append(Paragraph(f"<b>[24h Outlook]</b> {data.get('key_features_24h', '-')}", style_body))
-
-    # Row 1: 500hPa & Surface 24h
-    row1 = [
-        [prep_img(images['gph500'][2]), prep_img(images['surface'][2])],
-        [Paragraph("500hPa Analysis (+24h)", style_meta), Paragraph("Surface Analysis (+24h)", style_meta)]
-    ]
-    
-    # Build Image Table
-    img_table_data = row1
-    t_img = Table(img_table_data, colWidths=[90*mm, 90*mm])
-    t_img.setStyle(TableStyle([
-        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-        ('VALIGN', (0,0), (-1,-1), 'TOP'),
-        ('LEFTPADDING', (0,0), (-1,-1), 2),
-        ('RIGHTPADDING', (0,0), (-1,-1), 2),
-        ('BOTTOMPADDING', (0,0), (-1,-1), 5),
-    ]))
-    story.append(t_img)
 
-    story.append(Spacer(1, 3*mm))
-    story.append(Paragraph(f"<b>[48h Outlook]</b> {data.get('key_features_48h', '-')}", style_body))    
-
-    # Row 1: 500hPa & Surface 48h
-    row1 = [
-        [prep_img(images['gph500'][4]), prep_img(images['surface'][4])],
-        [Paragraph("500hPa Analysis (+48h)", style_meta), Paragraph("Surface Analysis (+48h)", style_meta)]
-    ]
-    
-    # Build Image Table
-    img_table_data = row1
-    t_img = Table(img_table_data, colWidths=[90*mm, 90*mm])
-    t_img.setStyle(TableStyle([
-        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-        ('VALIGN', (0,0), (-1,-1), 'TOP'),
-        ('LEFTPADDING', (0,0), (-1,-1), 2),
-        ('RIGHTPADDING', (0,0), (-1,-1), 2),
-        ('BOTTOMPADDING', (0,0), (-1,-1), 5),
-    ]))
-    story.append(t_img)
+    # Outlook text followed by the 500hPa & Surface charts for that step
+    for idx, step, key, label in (
+        (2, "+24h", "key_features_24h", "24h Outlook"),
+        (4, "+48h", "key_features_48h", "48h Outlook"),
+    ):
+        story.append(Spacer(1, 3*mm))
+        story.append(Paragraph(f"<b>[{label}]</b> {data.get(key, '-')}", style_body))
+        story.append(image_table(
+            [(images['gph500'][idx], f"500hPa Analysis ({step})"), (images['surface'][idx], f"Surface Analysis ({step})")],
+        ))
 
     # 2. Hazards (Highlighted)
     story.append(Spacer(1, 3*mm))    
@@ -584,12 +768,7 @@ def build_stylish_pdf(base_utc, urls, images, data) -> bytes:
                 ])     
 
         t_regional = Table(table_data, colWidths=[40*mm, 130*mm])
-        t_regional.setStyle(TableStyle([
-            ('GRID', (0,0), (-1,-1), 0.5, colors.lightgrey),
-            ('BACKGROUND', (0,0), (0,-1), colors.whitesmoke), # Shade the region column
-            ('VALIGN', (0,0), (-1,-1), 'TOP'),
-            ('PADDING', (0,0), (-1,-1), 6),
-        ]))
+        t_regional.setStyle(LABELED_TABLE_STYLE)
         story.append(t_regional)                              
     else:
         story.append(Paragraph("No significant hazards reported.", style_body))
@@ -611,12 +790,7 @@ def build_stylish_pdf(base_utc, urls, images, data) -> bytes:
     
     if table_data:
         t_regional = Table(table_data, colWidths=[40*mm, 130*mm])
-        t_regional.setStyle(TableStyle([
-            ('GRID', (0,0), (-1,-1), 0.5, colors.lightgrey),
-            ('BACKGROUND', (0,0), (0,-1), colors.whitesmoke), # Shade the region column
-            ('VALIGN', (0,0), (-1,-1), 'TOP'),
-            ('PADDING', (0,0), (-1,-1), 6),
-        ]))
+        t_regional.setStyle(LABELED_TABLE_STYLE)
         story.append(t_regional)
 
     # 4. Uncertainties
@@ -625,36 +799,29 @@ def build_stylish_pdf(base_utc, urls, images, data) -> bytes:
 
     # Build
     doc.build(story)
-    
-    final = io.BytesIO()
-    final.write(buffer.getvalue())
-    final.seek(0)
-    return final.read()
+    return output_path
+
+# Optional: orjson parses the briefing JSON faster when it is installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def json_loads(text):
+    # orjson.JSONDecodeError is a subclass of json.JSONDecodeError
+    return orjson.loads(text) if orjson else json.loads(text)
 
 def clean_parse_json(text):
     """
-    Safely parses JSON from Gemini output, handling both 
-    Markdown code blocks (```json ... ```) and raw JSON strings.
+    Parse the briefing JSON from Gemini output.
+    The response is constrained to BRIEFING_GENERATION_CONFIG's schema,
+    so it is plain JSON with no Markdown code block around it.
     """
     try:
-        # 1. Try parsing directly (Best for 'response_mime_type="application/json"')
-        return json.loads(text)
+        return json_loads(text)
     except json.JSONDecodeError:
-        pass  # If failed, try cleaning
-
-    try:
-        # 2. Extract JSON content using Regex (Handles ```json, ```, and plain text)
-        # Looks for the first '{' and the last '}'
-        match = re.search(r"\{.*\}", text, re.DOTALL)
-        if match:
-            cleaned_text = match.group(0)
-            return json.loads(cleaned_text)
-    except (json.JSONDecodeError, AttributeError):
-        pass
-
-    # 3. Fallback: Return empty dict or raise specific error
-    print(f"❌ JSON Parsing Failed. Raw text preview: {text[:100]}...")
-    return {}
+        print(f"❌ JSON Parsing Failed. Raw text preview: {text[:100]}...")
+        return {}
 
 def main():
     base_utc, ymd, hhh = get_base_time_strings()
@@ -663,30 +830,32 @@ def main():
     urls = build_kma_urls(ymd, hhh)
 
     print("Downloading images...")
-    images = {
-        "wv": fetch_image(urls["wv"]),
-        "surface": [fetch_image(u) for u in urls["surface"]],
-        "gph500": [fetch_image(u) for u in urls["gph500"]],
-        "wnd850": [fetch_image(u) for u in urls["wnd850"]],
-    }
+    purge_image_cache()
+    purge_llm_cache()
+    # Gemini and the PDF only look at the 0h/24h/48h steps, so the
+    # other steps are not downloaded and Gemini can start right after these.
+    images = download_images(urls, PDF_STEP_INDICES)
 
     print("Generating analysis with Gemini...")
-    # Gemini에게 이미지를 함께 전달 (텍스트 프롬프트 + 이미지)
-    briefing_text = generate_briefing_text(base_utc, images)
+    # The PDF charts only depend on the downloads, so they are
+    # downscaled in the background while Gemini writes the briefing.
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        # Gemini에게 이미지를 함께 전달 (텍스트 프롬프트 + 이미지)
+        briefing_future = ex.submit(generate_briefing_text, base_utc, images)
+        pdf_images_future = ex.submit(shrink_images, images)
+        briefing_text = briefing_future.result()
+        pdf_images = pdf_images_future.result()
     
     print("Building PDF...")
-    pdf_bytes = build_stylish_pdf(base_utc, urls, images, clean_parse_json(briefing_text))    
+    pdf_filename = f"KP_Daily_Briefing_{base_utc.strftime('%Y%m%d_00UTC')}_Gemini.pdf"
+    build_stylish_pdf(base_utc, urls, pdf_images, clean_parse_json(briefing_text), pdf_filename)
+    print(f"✅ PDF saved: {pdf_filename}")
 
-    post_to_discord(pdf_bytes, base_utc, clean_parse_json(briefing_text))
+    post_to_discord(pdf_filename, base_utc, clean_parse_json(briefing_text))
 
     #print("Building Stylish PDF...")
     # CALL THE NEW FUNCTION HERE
     #pdf_bytes = build_stylish_pdf(base_utc, urls, images, json_data)
-    
-    pdf_filename = f"KP_Daily_Briefing_{base_utc.strftime('%Y%m%d_00UTC')}_Gemini.pdf"
-    with open(pdf_filename, "wb") as f:
-        f.write(pdf_bytes)
-    print(f"✅ PDF saved: {pdf_filename}")
 
 if __name__ == "__main__":
     main()
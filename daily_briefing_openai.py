@@ -2,14 +2,22 @@ import os
 import io
 import json
 import re
-import base64
+import binascii
+import hashlib
+import functools
+import shutil
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
 
 import pytz
 from dotenv import load_dotenv
 
 from openai import OpenAI
+from PIL import Image, ImageDraw
 
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm
@@ -40,6 +48,23 @@ client = OpenAI(api_key=OPENAI_API_KEY)
 
 KST = pytz.timezone("Asia/Seoul")
 
+# The 16 KMA charts are independent network round-trips to one host,
+# so they are downloaded in parallel over a shared keep-alive session.
+MAX_DOWNLOAD_WORKERS = 8
+
+# Files API uploads go to OpenAI rather than KMA, so they are sized
+# separately from the chart download pool.
+MAX_UPLOAD_WORKERS = 4
+
+# Shared keep-alive session for KMA, font and Discord calls
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_maxsize=MAX_DOWNLOAD_WORKERS,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
 # Map JSON keys to Display Names
 REGION_MAP = {
     "seoul_metro": "수도권 (Seoul/Metro)",
@@ -64,7 +89,7 @@ def register_korean_font():
     if not os.path.exists(KOREAN_FONT_PATH):
         print("Downloading Korean font (NanumGothic)...")
         try:
-            resp = requests.get(KOREAN_FONT_URL, timeout=10)
+            resp = SESSION.get(KOREAN_FONT_URL, timeout=10)
             resp.raise_for_status()
             with open(KOREAN_FONT_PATH, "wb") as f:
                 f.write(resp.content)
@@ -82,21 +107,24 @@ def register_korean_font():
         return False
 
 
-HAS_KOREAN_FONT = register_korean_font()
+# Registration runs on first PDF build, not at import time
+@functools.lru_cache(maxsize=1)
+def ensure_korean_font():
+    return register_korean_font()
 
 # ===================== TIME & URL HELPERS =====================
 
 
 def get_base_time_strings():
-	"""
-	Determine the base analysis time.
+    """
+    Determine the base analysis time.
 
-	The function uses the current date in KST and sets the base time
-	to 00 UTC of the same calendar date.
+    The function uses the current date in KST and sets the base time
+    to 00 UTC of the same calendar date.
 
-	Example:
-		2026-01-16 KST → base_utc = 2026-01-16 00:00 UTC
-	"""
+    Example:
+        2026-01-16 KST → base_utc = 2026-01-16 00:00 UTC
+    """
     now_kst = datetime.now(KST)
     base_utc = datetime(
         year=now_kst.year,
@@ -110,17 +138,17 @@ def get_base_time_strings():
 
 
 def build_kma_urls(ymd, hhh):
-	"""
-	Construct KMA image URLs.
+    """
+    Construct KMA image URLs.
 
-	Includes:
-	- Satellite WV imagery
-	- Surface analysis charts
-	- 500 hPa geopotential height charts
-	- 850 hPa wind charts
+    Includes:
+    - Satellite WV imagery
+    - Surface analysis charts
+    - 500 hPa geopotential height charts
+    - 850 hPa wind charts
 
-	Forecast steps: 0h, 12h, 24h, 36h, 48h.
-	"""
+    Forecast steps: 0h, 12h, 24h, 36h, 48h.
+    """
     base_time = f"{ymd}{hhh}"  # e.g., 2026011600
 
     wv_url = (
@@ -157,58 +185,208 @@ def build_kma_urls(ymd, hhh):
 
 
 def fetch_image(url, timeout=120):
-	"""
-	Download the image that will be embedded in the PDF.
+    """
+    Download the image that will be embedded in the PDF.
 
-	The image is returned as a BytesIO object. The same data will also be
-	converted into a base64 data URL and sent to the OpenAI model,
-	so the image only needs to be downloaded once.
-	"""
+    The image is returned as a BytesIO object. The same data will also be
+    converted into a base64 data URL and sent to the OpenAI model,
+    so the image only needs to be downloaded once.
+    """
     try:
-        resp = requests.get(url, timeout=timeout)
-        if resp.status_code == 200:
-            return io.BytesIO(resp.content)
-        else:
-            print(f"Image download failed [{resp.status_code}]: {url}")
-            return None
+        # Stream straight into the BytesIO so the body is not held twice
+        with SESSION.get(url, timeout=timeout, stream=True) as resp:
+            if resp.status_code != 200:
+                print(f"Image download failed [{resp.status_code}]: {url}")
+                return None
+            resp.raw.decode_content = True
+            img_io = io.BytesIO()
+            shutil.copyfileobj(resp.raw, img_io, 64 * 1024)
+            img_io.seek(0)
+            return img_io
     except Exception as e:
         print(f"Exception while downloading image: {e} ({url})")
         return None
 
 
+# The PDF draws charts at 85 mm and the vision model tiles at 768 px,
+# so larger originals only inflate the payload and the PDF.
+IMAGE_MAX_DIM = 768
+
+
+def downscale_png(img_io, max_dim=IMAGE_MAX_DIM):
+    """
+    Return a copy of `img_io` shrunk to fit within max_dim x max_dim,
+    re-encoded as an optimized PNG. Undecodable data is returned as-is.
+    """
+    try:
+        img = Image.open(img_io)
+        img.thumbnail((max_dim, max_dim), Image.LANCZOS)
+        out = io.BytesIO()
+        img.save(out, format="PNG", optimize=True)
+        out.seek(0)
+        return out
+    except Exception as e:
+        print(f"Image downscale failed, keeping original: {e}")
+        img_io.seek(0)
+        return img_io
+
+
+def fetch_and_downscale(url):
+    img_io = fetch_image(url)
+    return downscale_png(img_io) if img_io else None
+
+
+# Forecast steps used by the model and the PDF: 0h, 24h, 48h
+BRIEFING_STEP_INDICES = (0, 2, 4)
+PANEL_LABELS = ("00h", "24h", "48h")
+
+
+def compose_forecast_panels(frames, labels=PANEL_LABELS):
+    """
+    Paste the forecast frames of one chart type side by side (left to
+    right in step order) and label each panel, so the model gets one
+    image per chart type instead of one per step. Missing frames are
+    left blank. Returns a PNG BytesIO, or None if no frame is usable.
+    """
+    panels = []
+    for img_io in frames:
+        if img_io is None:
+            panels.append(None)
+            continue
+        try:
+            panels.append(Image.open(img_io).convert("RGB"))
+        except Exception as e:
+            print(f"Cannot read chart for composite: {e}")
+            panels.append(None)
+        img_io.seek(0)
+
+    usable = [p for p in panels if p is not None]
+    if not usable:
+        return None
+
+    w = max(p.width for p in usable)
+    h = max(p.height for p in usable)
+    sheet = Image.new("RGB", (w * len(panels), h), "white")
+    draw = ImageDraw.Draw(sheet)
+    for i, (panel, label) in enumerate(zip(panels, labels)):
+        if panel is not None:
+            sheet.paste(panel, (i * w, 0))
+        draw.rectangle((i * w, 0, i * w + 34, 14), fill="white")
+        draw.text((i * w + 3, 2), label, fill="black")
+
+    out = io.BytesIO()
+    sheet.save(out, format="PNG", optimize=True)
+    out.seek(0)
+    return out
+
+
+def download_images(urls, steps=None):
+    """
+    Download the charts concurrently, downscaling each as it arrives.
+    Only the forecast step indices in `steps` are fetched (all when None).
+    Returns a dict with the same layout as `urls`
+    (BytesIO or None for each entry; None for skipped steps).
+    """
+    with ThreadPoolExecutor(max_workers=MAX_DOWNLOAD_WORKERS) as ex:
+        wv = ex.submit(fetch_and_downscale, urls["wv"])
+        charts = {
+            key: [
+                ex.submit(fetch_and_downscale, u) if steps is None or idx in steps else None
+                for idx, u in enumerate(urls[key])
+            ]
+            for key in ("surface", "gph500", "wnd850")
+        }
+        return {
+            "wv": wv.result(),
+            **{key: [f.result() if f else None for f in futures] for key, futures in charts.items()},
+        }
+
+
+# Multiple of 3, so each chunk encodes to whole base64 quanta (no padding)
+B64_CHUNK_SIZE = 57 * 1024
+
+
 def bytesio_to_data_url(img_io, mime="image/png"):
-	"""
-	Convert a BytesIO image into a base64 data URL
-	(data:image/png;base64,...).
+    """
+    Convert a BytesIO image into a base64 data URL
+    (data:image/png;base64,...).
+
+    This avoids requiring the OpenAI server to fetch external URLs,
+    which helps prevent timeouts when accessing KMA image servers.
 
-	This avoids requiring the OpenAI server to fetch external URLs,
-	which helps prevent timeouts when accessing KMA image servers.
-	"""
+    The image is encoded chunk by chunk into one growing buffer, so the
+    raw bytes are never copied out of the BytesIO and no intermediate
+    base64 string is built before the final one.
+    """
     if img_io is None:
         return None
     img_io.seek(0)
-    b64 = base64.b64encode(img_io.read()).decode("utf-8")
-    return f"data:{mime};base64,{b64}"
+    out = bytearray(f"data:{mime};base64,".encode("ascii"))
+    while chunk := img_io.read(B64_CHUNK_SIZE):
+        out += binascii.b2a_base64(chunk, newline=False)
+    return out.decode("ascii")
 
 
 # ===================== OPENAI: JSON BRIEFING GENERATION =====================
 
+LLM_CACHE_DIR = "llm_cache"
+# A stored briefing is reused for a rerun (e.g. after a failed Discord
+# upload) on the same charts, but never past a day.
+RESPONSE_CACHE_TTL = 24 * 3600
+# Charts change every run, so older encodings/responses are never hit again
+LLM_CACHE_MAX_AGE_HOURS = 48
 
-def generate_briefing_json(base_utc, images):
+
+def purge_llm_cache(max_age_hours=LLM_CACHE_MAX_AGE_HOURS):
     """
-    Use OpenAI Responses API (multimodal) to analyze KMA charts
-    using locally-downloaded images (BytesIO → base64 data URLs).
-    Returns a Python dict with the briefing JSON.
+    Remove cached data URLs and briefing responses older than
+    `max_age_hours` (the Files API manifest is kept).
     """
-    valid_str = base_utc.strftime("%Y.%m.%d.%H UTC")
-    kst_str = (base_utc + timedelta(hours=9)).strftime("%Y-%m-%d %H시")
+    if not os.path.isdir(LLM_CACHE_DIR):
+        return
+    cutoff = time.time() - max_age_hours * 3600
+    for entry in os.scandir(LLM_CACHE_DIR):
+        if not (entry.name.endswith(".b64") or entry.name.startswith("response_")):
+            continue
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError as e:
+            print(f"Failed to purge LLM cache entry: {e}")
+
+
+def cached_data_url(img_io, digest):
+    """
+    Return the data URL for `img_io`, reusing the encoding stored under
+    its `digest` (image_digest) by an earlier run. A hit means KMA served
+    byte-identical chart data, which is logged so a stale chart is easy to spot.
+    """
+    if img_io is None:
+        return None
+    cache_path = os.path.join(LLM_CACHE_DIR, digest + ".b64")
+
+    if os.path.exists(cache_path):
+        print(f"Image unchanged since an earlier run (digest {digest[:12]})")
+        with open(cache_path, "r", encoding="ascii") as f:
+            return f.read()
 
-    prompt_text = f"""
+    data_url = bytesio_to_data_url(img_io)
+    try:
+        os.makedirs(LLM_CACHE_DIR, exist_ok=True)
+        with open(cache_path, "w", encoding="ascii") as f:
+            f.write(data_url)
+    except OSError as e:
+        print(f"Failed to cache image data URL: {e}")
+    return data_url
+
+
+# Static instructions come first and the per-run Valid time follows as a
+# separate input, so every request starts with an identical prefix that
+# OpenAI's automatic prompt caching can reuse.
+STATIC_PROMPT = """
 당신은 한국 기상청 수석 예보관입니다.
 첨부된 위성영상(WV), 지상일기도(Surface), 500hPa, 850hPa 차트를 분석하여 일일 브리핑을 작성하세요.
 
-Valid 시간: {valid_str} (KST: {kst_str})
-
 아래 포맷에 맞춰 **한국어**로 작성해 주세요.
 기상학적 전문 용어를 사용하되, 논리적 근거(Reasoning)를 명확히 하세요.
 
@@ -219,16 +397,16 @@ Valid 시간: {valid_str} (KST: {kst_str})
 5. 주요 불확실성 (Uncertainties)
 6. 내부 브리핑 요약 (3~5줄)
 
-지상, 500hPa, 850hPa 차트는 각각 0h, 24h, 48h 예측장입니다. 시계열 변화를 분석에 반영하세요.
+지상, 500hPa, 850hPa 차트는 종류별로 한 장씩 첨부되며, 각 이미지는 좌: 00h, 중: 24h, 우: 48h 예측장입니다. 시계열 변화를 분석에 반영하세요.
 
 아래 JSON 스키마를 정확히 따르되, **JSON만** 출력하세요. (그 외 텍스트 금지)
 
-{{
+{
   "title": "한반도 일일 기상 브리핑",
   "synoptic_overview": "종관 개황 내용...",
   "key_features_24h": "24시간 예측 주요 특징...",
   "key_features_48h": "48시간 예측 주요 특징...",
-  "sensible_weather": {{
+  "sensible_weather": {
       "seoul_metro": "수도권 날씨...",
       "gangwon": "강원도 날씨...",
       "chungcheong": "충청권...",
@@ -236,38 +414,141 @@ Valid 시간: {valid_str} (KST: {kst_str})
       "gyeongsang": "경상권...",
       "jeju": "제주도...",
       "sea": "해상..."
-  }},
+  },
   "hazards": ["위험기상요소1: 주요 특징...", "위험기상요소2: 주요 특징..."],
   "uncertainties": "주요 불확실성...",
   "summary": "내부 브리핑 요약 (3~5줄)"
-}}
+}
 """
 
+
+OPENAI_FILES_MANIFEST = os.path.join(LLM_CACHE_DIR, "openai_files.json")
+
+# Uploaded charts are deleted by OpenAI after this long, so they do
+# not pile up in account storage.
+OPENAI_FILE_TTL_SECONDS = 48 * 3600
+
+
+def load_files_manifest():
+    """Load the uploaded-file manifest without expired entries."""
+    try:
+        with open(OPENAI_FILES_MANIFEST, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    now = time.time()
+    return {
+        digest: entry for digest, entry in manifest.items()
+        if isinstance(entry, dict) and entry.get("expires", 0) > now
+    }
+
+
+def save_files_manifest(manifest):
+    try:
+        os.makedirs(LLM_CACHE_DIR, exist_ok=True)
+        with open(OPENAI_FILES_MANIFEST, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+    except OSError as e:
+        print(f"Failed to save OpenAI files manifest: {e}")
+
+
+def image_digest(img_io):
+    """Content hash used to dedupe and cache images; blake2b is cheaper than sha256."""
+    return hashlib.blake2b(img_io.getbuffer(), digest_size=16).hexdigest()
+
+
+def upload_image_file(img_io, digest, manifest):
+    """
+    Upload `img_io` through the Files API and return its file_id,
+    reusing an earlier upload of the same bytes (keyed by `digest`)
+    while it is still valid.
+    """
+    entry = manifest.get(digest)
+    # Re-upload files within an hour of expiry
+    if not entry or entry["expires"] < time.time() + 3600:
+        file_obj = client.files.create(
+            file=(f"{digest[:16]}.png", img_io.getvalue(), "image/png"),
+            purpose="vision",
+            expires_after={"anchor": "created_at", "seconds": OPENAI_FILE_TTL_SECONDS},
+        )
+        expires = file_obj.expires_at or file_obj.created_at + OPENAI_FILE_TTL_SECONDS
+        entry = {"id": file_obj.id, "expires": expires}
+        manifest[digest] = entry
+    return entry["id"]
+
+
+def generate_briefing_json(base_utc, images):
+    """
+    Use OpenAI Responses API (multimodal) to analyze KMA charts
+    using locally-downloaded images (uploaded once via the Files API,
+    base64 data URLs as a fallback).
+    Returns the model's JSON text.
+    """
+    valid_str = base_utc.strftime("%Y.%m.%d.%H UTC")
+    kst_str = (base_utc + timedelta(hours=9)).strftime("%Y-%m-%d %H시")
+
     content = [
-        {"type": "input_text", "text": prompt_text},
+        {"type": "input_text", "text": STATIC_PROMPT},
+        {"type": "input_text", "text": f"Valid 시간: {valid_str} (KST: {kst_str})"},
     ]
 
-    def add_img_io(img_io):
-        data_url = bytesio_to_data_url(img_io)
-        if data_url:
-            content.append(
-                {
-                    "type": "input_image",
-                    "image_url": data_url,
-                }
-            )
-
-    # 1) Satellite WV
-    add_img_io(images.get("wv"))
+    # Images are always attached in the same order (WV, then surface/500/850
+    # composites) so identical charts give an identical request prefix.
+    # WV: broad moisture patterns, so 512 px low detail is enough.
+    # Each chart type goes in as one 00h | 24h | 48h sheet, which costs
+    # fewer image tokens than three separate attachments.
+    attachments = [(images.get("wv"), "low")]
+    for chart, chart_label in (("surface", "지상"), ("gph500", "500hPa"), ("wnd850", "850hPa")):
+        frames = [images[chart][idx] for idx in BRIEFING_STEP_INDICES]
+        attachments.append((compose_forecast_panels(frames), "auto"))
+
+        # KMA sometimes serves the previous step again when a step is not
+        # produced yet; tell the model instead of letting it read a trend
+        digests = [image_digest(f) if f is not None else None for f in frames]
+        for i in range(1, len(frames)):
+            if digests[i] is not None and digests[i] == digests[i - 1]:
+                content.append({
+                    "type": "input_text",
+                    "text": f"참고: {chart_label} {PANEL_LABELS[i - 1]}와 {PANEL_LABELS[i]} 차트가 동일합니다 (미생성 예측장일 수 있음).",
+                })
+
+    # Hash every attachment once and drop byte-identical duplicates
+    unique = {}
+    for img_io, detail in attachments:
+        if img_io is not None:
+            unique.setdefault(image_digest(img_io), (img_io, detail))
+
+    # Cache key: base time, prompt, notes and the content of every attached image
+    key = hashlib.sha256()
+    key.update(base_utc.isoformat().encode())
+    for part in content:
+        key.update(part["text"].encode())
+    for digest in unique:
+        key.update(digest.encode())
+
+    cache_path = os.path.join(LLM_CACHE_DIR, f"response_{key.hexdigest()}.json")
+    if os.path.exists(cache_path) and time.time() - os.path.getmtime(cache_path) < RESPONSE_CACHE_TTL:
+        print(f"Using cached briefing: {cache_path}")
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    # Reference each chart by file_id instead of inlining base64;
+    # fall back to a data URL if an upload fails.
+    manifest = load_files_manifest()
+
+    def to_image_part(item):
+        digest, (img_io, detail) = item
+        try:
+            return {"type": "input_image", "file_id": upload_image_file(img_io, digest, manifest), "detail": detail}
+        except Exception as e:
+            print(f"File upload failed, sending image inline: {e}")
+            return {"type": "input_image", "image_url": cached_data_url(img_io, digest), "detail": detail}
 
-    # 2) Surface / 500 / 850 at 0h, 24h, 48h
-    idx_list = [0, 2, 4]
-    for idx in idx_list:
-        add_img_io(images["surface"][idx])
-        add_img_io(images["gph500"][idx])
-        add_img_io(images["wnd850"][idx])
+    with ThreadPoolExecutor(max_workers=MAX_UPLOAD_WORKERS) as ex:
+        content.extend(ex.map(to_image_part, unique.items()))
+    save_files_manifest(manifest)
 
-    print("Calling OpenAI for briefing JSON (with base64 images)...")
+    print("Calling OpenAI for briefing JSON...")
     response = client.responses.create(
         #model="gpt-4.1-mini",  # or "gpt-5.2-pro" if you want higher quality & cost
         model="gpt-5.2-pro",
@@ -293,32 +574,71 @@ Valid 시간: {valid_str} (KST: {kst_str})
     #    print("❌ Failed to parse JSON from model. Raw preview:")
     #    print(raw[:500])
     #    data = {}
+    # A truncated or malformed answer is not cached, so a rerun asks again
+    if raw and clean_parse_json(raw):
+        try:
+            os.makedirs(LLM_CACHE_DIR, exist_ok=True)
+            with open(cache_path, "w", encoding="utf-8") as f:
+                f.write(raw)
+        except OSError as e:
+            print(f"Failed to cache briefing: {e}")
     return raw
 
 
 # ===================== PDF BUILDING (STYLISH) =====================
 
 
-def build_stylish_pdf(base_utc, urls, images, data) -> bytes:
+def jpeg_if_smaller(img_io, quality=80):
     """
-    Stylish single-PDF builder using ReportLab platypus.
-    `images` is a dict of BytesIO objects (or None).
-    `data` is the dict returned by generate_briefing_json().
+    Re-encode a chart as JPEG for PDF embedding when that is smaller.
+    ReportLab embeds JPEG data as-is but re-compresses PNG pixels, so
+    colour-filled charts shrink a lot; line-art charts whose PNG is
+    already smaller are returned unchanged.
     """
-    buffer = io.BytesIO()
+    img_io.seek(0)
+    rgba = Image.open(img_io).convert("RGBA")
+    rgb = Image.new("RGB", rgba.size, "white")
+    rgb.paste(rgba, mask=rgba)
+
+    jpg = io.BytesIO()
+    rgb.save(jpg, format="JPEG", quality=quality, optimize=True)
+    if jpg.tell() < img_io.getbuffer().nbytes:
+        jpg.seek(0)
+        return jpg
+    img_io.seek(0)
+    return img_io
 
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        leftMargin=15 * mm,
-        rightMargin=15 * mm,
-        topMargin=15 * mm,
-        bottomMargin=15 * mm,
-    )
 
+# Image grid and label table styles
+IMAGE_TABLE_STYLE = TableStyle(
+    [
+        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+        ("LEFTPADDING", (0, 0), (-1, -1), 2),
+        ("RIGHTPADDING", (0, 0), (-1, -1), 2),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 5),
+    ]
+)
+
+LABELED_TABLE_STYLE = TableStyle(
+    [
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.lightgrey),
+        ("BACKGROUND", (0, 0), (0, -1), colors.whitesmoke),
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+        ("PADDING", (0, 0), (-1, -1), 6),
+    ]
+)
+
+
+@functools.lru_cache(maxsize=None)
+def get_briefing_styles(has_korean_font):
+    """
+    Paragraph styles for the briefing PDF. They only depend on whether
+    the Korean font is available, so they are built once per process.
+    """
     styles = getSampleStyleSheet()
-    font_main = FONT_NAME if HAS_KOREAN_FONT else "Helvetica"
-    font_bold = FONT_NAME if HAS_KOREAN_FONT else "Helvetica-Bold"
+    font_main = FONT_NAME if has_korean_font else "Helvetica"
+    font_bold = FONT_NAME if has_korean_font else "Helvetica-Bold"
 
     # Title Style
     style_title = ParagraphStyle(
@@ -375,6 +695,39 @@ def build_stylish_pdf(base_utc, urls, images, data) -> bytes:
         textColor=colors.black,
     )
 
+    return {
+        "title": style_title,
+        "meta": style_meta,
+        "h2": style_h2,
+        "body": style_body,
+        "summary_box": style_summary_box,
+    }
+
+
+def build_stylish_pdf(base_utc, urls, images, data) -> bytes:
+    """
+    Stylish single-PDF builder using ReportLab platypus.
+    `images` is a dict of BytesIO objects (or None).
+    `data` is the dict returned by generate_briefing_json().
+    """
+    buffer = io.BytesIO()
+
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        leftMargin=15 * mm,
+        rightMargin=15 * mm,
+        topMargin=15 * mm,
+        bottomMargin=15 * mm,
+    )
+
+    styles = get_briefing_styles(ensure_korean_font())
+    style_title = styles["title"]
+    style_meta = styles["meta"]
+    style_h2 = styles["h2"]
+    style_body = styles["body"]
+    style_summary_box = styles["summary_box"]
+
     story = []
 
     # ----- HEADER -----
@@ -411,9 +764,11 @@ def build_stylish_pdf(base_utc, urls, images, data) -> bytes:
     )
 
     # ----- IMAGES (GRID) -----
-    def prep_img(img_io, width=85 * mm, height=85 * mm):
+    # jpeg: try JPEG for the forecast charts; the WV image stays PNG
+    def prep_img(img_io, width=85 * mm, height=85 * mm, jpeg=True):
         if img_io:
             try:
+                img_io = jpeg_if_smaller(img_io) if jpeg else img_io
                 img_io.seek(0)
                 img = PlatypusImage(img_io, width=width, height=height)
                 img.hAlign = "CENTER"
@@ -422,99 +777,64 @@ def build_stylish_pdf(base_utc, urls, images, data) -> bytes:
                 return Paragraph("(이미지 오류)", style_meta)
         return Paragraph("(No Image)", style_meta)
 
-    # Row 1: Satellite & Surface 00h
-    row1 = [
-        [prep_img(images["wv"]), prep_img(images["surface"][0])],
-        [
-            Paragraph("GK2A Satellite (WV)", style_meta),
-            Paragraph("Surface Analysis (00h)", style_meta),
-        ],
-    ]
-
-    # Row 2: 500hPa 00h & 850hPa 00h
-    row2 = [
-        [prep_img(images["gph500"][0]), prep_img(images["wnd850"][0])],
-        [
-            Paragraph("500hPa Analysis (00h)", style_meta),
-            Paragraph("850hPa Analysis (00h)", style_meta),
-        ],
-    ]
-
-    img_table_data = row1 + row2
-    t_img = Table(img_table_data, colWidths=[90 * mm, 90 * mm])
-    t_img.setStyle(
-        TableStyle(
-            [
-                ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                ("VALIGN", (0, 0), (-1, -1), "TOP"),
-                ("LEFTPADDING", (0, 0), (-1, -1), 2),
-                ("RIGHTPADDING", (0, 0), (-1, -1), 2),
-                ("BOTTOMPADDING", (0, 0), (-1, -1), 5),
-            ]
-        )
-    )
-    story.append(t_img)
+    # Rows of (image, caption) pairs -> two-column image table
+    # (the WV image stays PNG, every forecast chart may become JPEG)
+    def image_table(*rows):
+        table_data = []
+        for row in rows:
+            table_data.append(
+                [prep_img(img_io, jpeg=img_io is not images["wv"]) for img_io, _ in row]
+            )
+            table_data.append([Paragraph(caption, style_meta) for _, caption in row])
+        t_img = Table(table_data, colWidths=[90 * mm, 90 * mm])
+        t_img.setStyle(IMAGE_TABLE_STYLE)
+        return t_img
 
-    story.append(Spacer(1, 3 * mm))
     story.append(
-        Paragraph(f"<b>[24h Outlook]</b> {data.get('key_features_24h', '-')}", style_body)
-    )
-
-    # Row: 500hPa & Surface 24h
-    row24 = [
-        [prep_img(images["gph500"][2]), prep_img(images["surface"][2])],
-        [
-            Paragraph("500hPa Analysis (+24h)", style_meta),
-            Paragraph("Surface Analysis (+24h)", style_meta),
-        ],
-    ]
-    t_img24 = Table(row24, colWidths=[90 * mm, 90 * mm])
-    t_img24.setStyle(
-        TableStyle(
+        image_table(
             [
-                ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                ("VALIGN", (0, 0), (-1, -1), "TOP"),
-                ("LEFTPADDING", (0, 0), (-1, -1), 2),
-                ("RIGHTPADDING", (0, 0), (-1, -1), 2),
-                ("BOTTOMPADDING", (0, 0), (-1, -1), 5),
-            ]
+                (images["wv"], "GK2A Satellite (WV)"),
+                (images["surface"][0], "Surface Analysis (00h)"),
+            ],
+            [
+                (images["gph500"][0], "500hPa Analysis (00h)"),
+                (images["wnd850"][0], "850hPa Analysis (00h)"),
+            ],
         )
     )
-    story.append(t_img24)
-
-    story.append(Spacer(1, 3 * mm))
-    story.append(
-        Paragraph(f"<b>[48h Outlook]</b> {data.get('key_features_48h', '-')}", style_body)
-    )
 
-    # Row: 500hPa & Surface 48h
-    row48 = [
-        [prep_img(images["gph500"][4]), prep_img(images["surface"][4])],
-        [
-            Paragraph("500hPa Analysis (+48h)", style_meta),
-            Paragraph("Surface Analysis (+48h)", style_meta),
-        ],
-    ]
-    t_img48 = Table(row48, colWidths=[90 * mm, 90 * mm])
-    t_img48.setStyle(
-        TableStyle(
-            [
-                ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                ("VALIGN", (0, 0), (-1, -1), "TOP"),
-                ("LEFTPADDING", (0, 0), (-1, -1), 2),
-                ("RIGHTPADDING", (0, 0), (-1, -1), 2),
-                ("BOTTOMPADDING", (0, 0), (-1, -1), 5),
-            ]
+    # Outlook text followed by the 500hPa & Surface charts for that step
+    for idx, step, key, label in (
+        (2, "+24h", "key_features_24h", "24h Outlook"),
+        (4, "+48h", "key_features_48h", "48h Outlook"),
+    ):
+        story.append(Spacer(1, 3 * mm))
+        story.append(Paragraph(f"<b>[{label}]</b> {data.get(key, '-')}", style_body))
+        story.append(
+            image_table(
+                [
+                    (images["gph500"][idx], f"500hPa Analysis ({step})"),
+                    (images["surface"][idx], f"Surface Analysis ({step})"),
+                ],
+            )
         )
-    )
-    story.append(t_img48)
 
     # ----- HAZARDS -----
     story.append(Spacer(1, 3 * mm))
     story.append(Paragraph("2. Hazards & Warnings", style_h2))
 
     hazards = data.get("hazards", [])
-    if hazards:
+    if hazards and len(hazards) <= 5:
+        # A short list reads fine as one bulleted Paragraph, laid out once
+        lines = []
+        for h in hazards:
+            if ":" in h:
+                head, body = h.split(":", 1)
+                lines.append(f"• <b>{head}</b>: {body.strip()}")
+            else:
+                lines.append(f"• {h}")
+        story.append(Paragraph("<br/>".join(lines), style_body))
+    elif hazards:
         table_data = []
         for h in hazards:
             if ":" in h:
@@ -534,16 +854,7 @@ def build_stylish_pdf(base_utc, urls, images, data) -> bytes:
                 )
 
         t_haz = Table(table_data, colWidths=[40 * mm, 130 * mm])
-        t_haz.setStyle(
-            TableStyle(
-                [
-                    ("GRID", (0, 0), (-1, -1), 0.5, colors.lightgrey),
-                    ("BACKGROUND", (0, 0), (0, -1), colors.whitesmoke),
-                    ("VALIGN", (0, 0), (-1, -1), "TOP"),
-                    ("PADDING", (0, 0), (-1, -1), 6),
-                ]
-            )
-        )
+        t_haz.setStyle(LABELED_TABLE_STYLE)
         story.append(t_haz)
     else:
         story.append(Paragraph("No significant hazards reported.", style_body))
@@ -566,16 +877,7 @@ def build_stylish_pdf(base_utc, urls, images, data) -> bytes:
 
     if table_data:
         t_regional = Table(table_data, colWidths=[40 * mm, 130 * mm])
-        t_regional.setStyle(
-            TableStyle(
-                [
-                    ("GRID", (0, 0), (-1, -1), 0.5, colors.lightgrey),
-                    ("BACKGROUND", (0, 0), (0, -1), colors.whitesmoke),
-                    ("VALIGN", (0, 0), (-1, -1), "TOP"),
-                    ("PADDING", (0, 0), (-1, -1), 6),
-                ]
-            )
-        )
+        t_regional.setStyle(LABELED_TABLE_STYLE)
         story.append(t_regional)
 
     # ----- UNCERTAINTIES -----
@@ -585,10 +887,10 @@ def build_stylish_pdf(base_utc, urls, images, data) -> bytes:
     # Build document
     doc.build(story)
 
-    final = io.BytesIO()
-    final.write(buffer.getvalue())
-    final.seek(0)
-    return final.read()
+    # One copy out of the buffer, then release the buffer's own memory
+    pdf_bytes = buffer.getvalue()
+    buffer.close()
+    return pdf_bytes
 
 
 # ===================== DISCORD UPLOAD =====================
@@ -615,7 +917,7 @@ def post_to_discord(pdf_bytes, base_utc, data):
     }
 
     try:
-        resp = requests.post(DISCORD_WEBHOOK_URL, data=data, files=files)
+        resp = SESSION.post(DISCORD_WEBHOOK_URL, data=data, files=files)
         resp.raise_for_status()
         print("✅ PDF sent to Discord.")
     except Exception as e:
@@ -623,6 +925,20 @@ def post_to_discord(pdf_bytes, base_utc, data):
 
 # ===================== PARSE JSON =====================
 
+# First '{' through the last '}'
+JSON_OBJECT_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+# Use orjson when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_loads(text):
+    return orjson.loads(text) if orjson else json.loads(text)
+
+
 def clean_parse_json(text):
     """
     Safely parses JSON from Gemini output, handling both
@@ -630,21 +946,28 @@ def clean_parse_json(text):
     """
     try:
         # 1. Try parsing directly (Best for 'response_mime_type="application/json"')
-        return json.loads(text)
+        return json_loads(text)
     except json.JSONDecodeError:
         pass  # If failed, try cleaning
 
     try:
-        # 2. Extract JSON content using Regex (Handles ```json, ```, and plain text)
+        # 2. Strip a Markdown code fence (the usual failure) without a regex
+        stripped = text.strip().removeprefix("```json").removeprefix("```").removesuffix("```")
+        return json_loads(stripped)
+    except json.JSONDecodeError:
+        pass
+
+    try:
+        # 3. Extract JSON content using Regex (Handles surrounding plain text)
         # Looks for the first '{' and the last '}'
-        match = re.search(r"\{.*\}", text, re.DOTALL)
+        match = JSON_OBJECT_RE.search(text)
         if match:
             cleaned_text = match.group(0)
-            return json.loads(cleaned_text)
+            return json_loads(cleaned_text)
     except (json.JSONDecodeError, AttributeError):
         pass
 
-    # 3. Fallback: Return empty dict or raise specific error
+    # 4. Fallback: Return empty dict or raise specific error
     print(f"❌ JSON Parsing Failed. Raw text preview: {text[:100]}...")
     return {}
     
@@ -656,14 +979,12 @@ def main():
     print(f"Target Time: {ymd}{hhh} (00UTC)")
 
     urls = build_kma_urls(ymd, hhh)
+    purge_llm_cache()
 
     print("Downloading images for PDF...")
-    images = {
-        "wv": fetch_image(urls["wv"]),
-        "surface": [fetch_image(u) for u in urls["surface"]],
-        "gph500": [fetch_image(u) for u in urls["gph500"]],
-        "wnd850": [fetch_image(u) for u in urls["wnd850"]],
-    }
+    # The +12h/+36h charts are used by neither OpenAI nor the PDF, so only
+    # the steps the briefing needs are fetched and OpenAI starts right after.
+    images = download_images(urls, BRIEFING_STEP_INDICES)
 
     print("Generating analysis with OpenAI...")
     data = generate_briefing_json(base_utc, images)
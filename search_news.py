@@ -1,18 +1,24 @@
 import os
 import io
+import hashlib
+import functools
+from collections import deque
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from google import genai
 from google.genai import types
 import time
 from datetime import datetime, timedelta, timezone
 import pytz
 from dotenv import load_dotenv
-import emoji
 import markdown
-import textwrap
 import re
+import html
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
 from reportlab.lib.utils import ImageReader
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
@@ -30,11 +36,25 @@ DISCORD_NEWS_WEBHOOK_URL = os.getenv("DISCORD_NEWS_WEBHOOK_URL")
 KOREAN_FONT_NAME = "NanumGothic"
 EMOJI_FONT_NAME = "NotoEmoji"
 
-pdfmetrics.registerFont(TTFont(KOREAN_FONT_NAME, "NanumGothic.ttf"))
-pdfmetrics.registerFont(TTFont(EMOJI_FONT_NAME, "NotoEmoji.ttf"))
+# Parsing a TTF is not free; skip fonts that are already registered
+# (e.g. when another module in the same process loaded them)
+for _font_name, _font_file in ((KOREAN_FONT_NAME, "NanumGothic.ttf"),
+                               (EMOJI_FONT_NAME, "NotoEmoji.ttf")):
+    if _font_name not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(_font_name, _font_file))
 
 KST = pytz.timezone("Asia/Seoul")
 
+# Shared keep-alive session for Discord, news pages and thumbnails
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
 # ----- Generate date strings based on today's 00 UTC -----
 def get_base_time_strings():
     now_kst = datetime.now(KST)
@@ -107,6 +127,60 @@ def get_weather_news():
         print(f"Error: {e}")
         return None
 
+# A rerun on the same UTC day (workflow retry, manual run) reuses the
+# earlier Gemini answer instead of searching again
+NEWS_CACHE_DIR = "llm_cache"
+NEWS_CACHE_TTL = 6 * 3600  # seconds
+
+def get_weather_news_cached():
+    path = os.path.join(
+        NEWS_CACHE_DIR, datetime.now(timezone.utc).strftime("news_%Y%m%d.md")
+    )
+    if os.path.exists(path) and time.time() - os.path.getmtime(path) < NEWS_CACHE_TTL:
+        print(f"📦 Using cached news: {path}")
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    news = get_weather_news()
+    if news:
+        try:
+            os.makedirs(NEWS_CACHE_DIR, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(news)
+        except OSError as e:
+            print(f"Failed to cache news: {e}")
+    return news
+
+# Webhooks allow 5 requests per 2 s; keep to 4 per window on our side
+# even when Discord sends no rate-limit headers
+WEBHOOK_WINDOW_SECONDS = 2.0
+WEBHOOK_MAX_PER_WINDOW = 4
+_webhook_sent = deque(maxlen=WEBHOOK_MAX_PER_WINDOW)
+
+def post_webhook(content, max_attempts=3):
+    """
+    POST one message to the news webhook, honouring Discord's rate limit:
+    at most WEBHOOK_MAX_PER_WINDOW posts per window, wait out Retry-After
+    on 429, and when the bucket is empty wait for it to reset before
+    returning so the next post goes straight through.
+    """
+    for _ in range(max_attempts):
+        if len(_webhook_sent) == WEBHOOK_MAX_PER_WINDOW:
+            wait = WEBHOOK_WINDOW_SECONDS - (time.monotonic() - _webhook_sent[0])
+            if wait > 0:
+                time.sleep(wait)
+        _webhook_sent.append(time.monotonic())
+        resp = SESSION.post(DISCORD_NEWS_WEBHOOK_URL, json={"content": content})
+        if resp.status_code == 429:
+            retry_after = float(resp.headers.get("Retry-After", 1))
+            print(f"   -> Rate limited, retrying in {retry_after:.1f}s")
+            time.sleep(retry_after)
+            continue
+        if resp.headers.get("X-RateLimit-Remaining") == "0":
+            time.sleep(float(resp.headers.get("X-RateLimit-Reset-After", 0)))
+        return resp
+    return resp
+
 def post_to_discord(content):
     """
     Splits long messages into chunks <= 2000 chars and sends them sequentially.
@@ -118,47 +192,206 @@ def post_to_discord(content):
     
     # If it fits in one message, just send it
     if len(content) <= LIMIT:
-        requests.post(DISCORD_NEWS_WEBHOOK_URL, json={"content": content})
+        post_webhook(content)
         print("✅ Posted to Discord (Single message)")
         return
 
     # --- SMART SPLITTING LOGIC ---
     print(f"⚠️ Content length ({len(content)}) exceeds limit. Splitting...")
     
-    lines = content.split('\n')
-    current_chunk = ""
-    
-    for line in lines:
+    # Build every chunk first, then send them back to back
+    chunks = []
+    # Collect lines in a list and join once per chunk; repeated string
+    # concatenation copies the whole chunk on every line
+    current_lines = []
+    current_len = 0
+
+    for line in content.split('\n'):
         # Check if adding this line (plus a newline) would exceed the limit
-        if len(current_chunk) + len(line) + 1 > LIMIT:
-            # Send the current chunk
-            requests.post(DISCORD_NEWS_WEBHOOK_URL, json={"content": current_chunk})
-            print("   -> Sent part")
-            
+        if current_lines and current_len + len(line) + 1 > LIMIT:
+            chunks.append("\n".join(current_lines))
             # Reset chunk to the current line
-            current_chunk = line + "\n"
-            
-            # Sleep briefly to be nice to Discord's servers
-            time.sleep(1)
+            current_lines = [line]
+            current_len = len(line) + 1
         else:
             # Add line to current chunk
-            current_chunk += line + "\n"
-            
-    # Send any remaining text
-    if current_chunk:
-        requests.post(DISCORD_NEWS_WEBHOOK_URL, json={"content": current_chunk})
-        print("   -> Sent final part")
+            current_lines.append(line)
+            current_len += len(line) + 1
+
+    # Keep any remaining text
+    if current_lines:
+        chunks.append("\n".join(current_lines))
+
+    # Sent in order (parts must not arrive shuffled); post_webhook only
+    # pauses when Discord says the rate-limit bucket is empty
+    for i, chunk in enumerate(chunks):
+        post_webhook(chunk)
+        print("   -> Sent final part" if i == len(chunks) - 1 else "   -> Sent part")
     
     print("✅ All parts posted successfully!")
 
-def is_emoji(ch: str) -> bool:
-    cp = ord(ch)
-    return (
-        0x1F300 <= cp <= 0x1FAFF   # Misc Symbols and Pictographs, etc.
-        or 0x2600 <= cp <= 0x26FF  # Misc symbols (☀, ☔, etc.)
-        or 0x2700 <= cp <= 0x27BF  # Dingbats
+# Emoji ranges drawn with EMOJI_FONT_NAME: Misc Symbols and Pictographs etc.
+# (U+1F300–1FAFF), Misc symbols (☀, ☔, U+2600–26FF) and Dingbats (U+2700–27BF).
+# re.split with the capturing group yields alternating text / emoji runs.
+EMOJI_RUN_RE = re.compile("([\U0001F300-\U0001FAFF\u2600-\u27BF]+)")
+
+# Per-(font, size) advance widths, filled on first sight of each character;
+# summing cached widths is cheaper than a stringWidth call per run
+WIDTH_CACHE = {}
+
+def run_width(run: str, font: str, font_size: float) -> float:
+    widths = WIDTH_CACHE.get((font, font_size))
+    if widths is None:
+        widths = WIDTH_CACHE[(font, font_size)] = {}
+    total = 0
+    for ch in run:
+        w = widths.get(ch)
+        if w is None:
+            w = widths[ch] = pdfmetrics.stringWidth(ch, font, font_size)
+        total += w
+    return total
+
+MD_LINK_RE = re.compile(r'\[([^\]]+)\]\(([^)]+)\)')
+MD_BULLET_RE = re.compile(r"^\s*[-*]\s+(.*)$")
+MD_BOLD_RE = re.compile(r"\*\*(.+?)\*\*")
+
+def classify_line(line: str) -> tuple:
+    """
+    Classify one markdown line for the news PDF as (kind, payload):
+      ("space", None)     blank line or --- rule
+      ("sources", label)  "**📚 Real Sources:**" heading, ** removed
+      ("h2", text)        any line with ** (bold markers removed)
+      ("bullet", text)    - item / * item
+      ("body", line)      everything else
+    """
+    stripped = line.strip()
+    if stripped == "" or stripped == "---":
+        return "space", None
+    if stripped.startswith("**📚") and "Real Sources" in line:
+        return "sources", stripped.strip("*")
+    if "**" in line:
+        # If there's at least one bold segment, treat the WHOLE line as H2.
+        # Remove all **...** markers for rendering (no match → unchanged).
+        headline_text = MD_BOLD_RE.sub(r"\1", line).strip()
+        if headline_text:
+            return "h2", headline_text
+    bullet_match = MD_BULLET_RE.match(line)
+    if bullet_match:
+        return "bullet", bullet_match.group(1)
+    return "body", line
+
+def emoji_runs(text: str, text_font: str, emoji_font: str) -> list:
+    """Split text into [(run, font)], one entry per text or emoji run."""
+    # ASCII (URLs, English source titles) cannot contain emoji
+    if text.isascii():
+        return [(text, text_font)] if text else []
+    return [
+        (run, emoji_font if i % 2 else text_font)
+        for i, run in enumerate(EMOJI_RUN_RE.split(text))
+        if run
+    ]
+
+def tokenize_line(line: str, text_font: str, emoji_font: str) -> list:
+    """
+    Split a markdown line once into pieces [(runs, url)]:
+      - normal text → url is None
+      - [title](url) → runs of the visible 'title', plus its url
+    The same pieces can be measured and then drawn without re-scanning.
+    """
+    pieces = []
+    pos = 0
+    for match in MD_LINK_RE.finditer(line):
+        start, end = match.span()
+        if start > pos:
+            pieces.append((emoji_runs(line[pos:start], text_font, emoji_font), None))
+        pieces.append((emoji_runs(match.group(1), text_font, emoji_font), match.group(2)))
+        pos = end
+    if pos < len(line):
+        pieces.append((emoji_runs(line[pos:], text_font, emoji_font), None))
+    return pieces
+
+def pieces_width(pieces: list, font_size: float) -> float:
+    return sum(
+        run_width(run, font, font_size)
+        for runs, _ in pieces
+        for run, font in runs
     )
 
+def measure_text_width(text, text_font, emoji_font, font_size=11):
+    return pieces_width([(emoji_runs(text, text_font, emoji_font), None)], font_size)
+
+def wrap_by_width(text: str, max_width: float, text_font: str, emoji_font: str,
+                  font_size: float) -> list:
+    """
+    Greedy word wrap on rendered width (points) rather than character
+    count, so lines of wide Hangul and narrow Latin both fill the column.
+    A word wider than a whole line is broken between characters.
+    Returns [] for blank text, like textwrap.
+    """
+    space_w = measure_text_width(" ", text_font, emoji_font, font_size)
+    lines = []
+    current, current_w = "", 0.0
+
+    for word in text.split():
+        word_w = measure_text_width(word, text_font, emoji_font, font_size)
+        if current and current_w + space_w + word_w <= max_width:
+            current += " " + word
+            current_w += space_w + word_w
+            continue
+        if current:
+            lines.append(current)
+        current, current_w = word, word_w
+
+        # Break an over-long word character by character
+        while current_w > max_width and len(current) > 1:
+            cut, cut_w = 0, 0.0
+            for ch in current:
+                ch_w = measure_text_width(ch, text_font, emoji_font, font_size)
+                if cut and cut_w + ch_w > max_width:
+                    break
+                cut += 1
+                cut_w += ch_w
+            lines.append(current[:cut])
+            current = current[cut:]
+            current_w = measure_text_width(current, text_font, emoji_font, font_size)
+
+    if current:
+        lines.append(current)
+    return lines
+
+def render_pieces(c, x, y, pieces: list, font_size: float) -> float:
+    """
+    Draw tokenized pieces at (x, y); links get a clickable rect over their
+    visible title. Returns the WIDTH advanced.
+    """
+    # Lay out every run first, then draw them in one text object grouped
+    # by font, so a line carries one Tf per font instead of one BT/Tf/ET
+    # block per run (which is what each drawString emits)
+    placed = []  # (font, x, run)
+    links = []   # (url, x_start, x_end)
+    cursor_x = x
+    for runs, url in pieces:
+        start_x = cursor_x
+        for run, font in runs:
+            placed.append((font, cursor_x, run))
+            cursor_x += run_width(run, font, font_size)
+        if url:
+            links.append((url, start_x, cursor_x))
+
+    if placed:
+        text_obj = c.beginText()
+        for font in dict.fromkeys(font for font, _, _ in placed):
+            text_obj.setFont(font, font_size)
+            for run_font, run_x, run in placed:
+                if run_font == font:
+                    text_obj.setTextOrigin(run_x, y)
+                    text_obj.textOut(run)
+        c.drawText(text_obj)
+
+    for url, x_start, x_end in links:
+        c.linkURL(url, (x_start, y - 2, x_end, y + font_size), relative=0)
+    return cursor_x - x
+
 def draw_segment_with_emoji(c, x, y, text: str,
                             text_font: str, emoji_font: str,
                             font_size: int = 11) -> float:
@@ -167,31 +400,8 @@ def draw_segment_with_emoji(c, x, y, text: str,
     using text_font for normal chars and emoji_font for emojis.
     Returns the WIDTH advanced (so caller can track cursor).
     """
-    cursor_x = x
-    buffer = ""
-
-    for ch in text:
-        if is_emoji(ch):
-            # flush normal buffer
-            if buffer:
-                c.setFont(text_font, font_size)
-                c.drawString(cursor_x, y, buffer)
-                cursor_x += pdfmetrics.stringWidth(buffer, text_font, font_size)
-                buffer = ""
-            # draw emoji
-            c.setFont(emoji_font, font_size)
-            c.drawString(cursor_x, y, ch)
-            cursor_x += pdfmetrics.stringWidth(ch, emoji_font, font_size)
-        else:
-            buffer += ch
+    return render_pieces(c, x, y, [(emoji_runs(text, text_font, emoji_font), None)], font_size)
 
-    if buffer:
-        c.setFont(text_font, font_size)
-        c.drawString(cursor_x, y, buffer)
-        cursor_x += pdfmetrics.stringWidth(buffer, text_font, font_size)
-
-    return cursor_x - x  # total width advanced
-                                
 def draw_markdown_line_with_links(
     c,
     x,
@@ -200,83 +410,89 @@ def draw_markdown_line_with_links(
     text_font: str,
     emoji_font: str,
     font_size: int = 11,
-):
+) -> float:
     """
     Draw a single line of markdown text:
       - normal text
       - [title](url) → only 'title' is visible, clickable via linkURL
+    Returns the WIDTH advanced.
     """
-    cursor_x = x
-    pos = 0
-    pattern = re.compile(r'\[([^\]]+)\]\(([^)]+)\)')
+    return render_pieces(c, x, y, tokenize_line(line, text_font, emoji_font), font_size)
 
-    for match in pattern.finditer(line):
-        start, end = match.span()
-        title = match.group(1)
-        url   = match.group(2)
-
-        # text before link
-        pre_text = line[pos:start]
-        if pre_text:
-            w = draw_segment_with_emoji(
-                c, cursor_x, y, pre_text,
-                text_font=text_font,
-                emoji_font=emoji_font,
-                font_size=font_size,
-            )
-            cursor_x += w
-
-        # link text (visible)
-        link_x_start = cursor_x
-        w = draw_segment_with_emoji(
-            c, link_x_start, y, title,
-            text_font=text_font,
-            emoji_font=emoji_font,
-            font_size=font_size,
-        )
-        link_x_end = link_x_start + w
+THUMB_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (compatible; WeatherNewsBot/1.0)"
+}
+# News pages and thumbnails fetched within this window are read from disk
+THUMB_CACHE_DIR = ".thumb_cache"
+THUMB_CACHE_TTL = 24 * 3600  # seconds
 
-        # clickable rect
-        c.linkURL(
-            url,
-            (link_x_start, y - 2, link_x_end, y + font_size),
-            relative=0,
-        )
-
-        cursor_x = link_x_end
-        pos = end
+def fetch_cached(url: str, timeout: float = 5.0, transform=None) -> bytes | None:
+    """
+    Return the body of `url`, from THUMB_CACHE_DIR when a fresh copy
+    exists, otherwise via SESSION (and store it). Raises on HTTP errors.
+    `transform(bytes) -> bytes | None` is applied before caching, so the
+    cache holds the processed result; if it returns None nothing is
+    cached and None is returned.
+    """
+    path = os.path.join(THUMB_CACHE_DIR, hashlib.sha1(url.encode()).hexdigest() + ".bin")
+    if os.path.exists(path) and time.time() - os.path.getmtime(path) < THUMB_CACHE_TTL:
+        with open(path, "rb") as f:
+            return f.read()
+
+    resp = SESSION.get(url, headers=THUMB_HEADERS, timeout=timeout)
+    resp.raise_for_status()
+    data = transform(resp.content) if transform else resp.content
+    if data is None:
+        return None
+    try:
+        os.makedirs(THUMB_CACHE_DIR, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+    except OSError as e:
+        print(f"[thumb] Failed to cache {url}: {e}")
+    return data
 
-    # tail after last link
-    tail = line[pos:]
-    if tail:
-        draw_segment_with_emoji(
-            c, cursor_x, y, tail,
-            text_font=text_font,
-            emoji_font=emoji_font,
-            font_size=font_size,
-        )
+# Thumbnails are drawn 120 pt tall; hero photos are often several MB
+THUMB_MAX_PX = 256
 
-def measure_text_width(text, text_font, emoji_font, font_size=11):
-    from reportlab.pdfbase import pdfmetrics
-
-    width = 0
-    buffer = ""
-    for ch in text:
-        if is_emoji(ch):
-            # flush buffer
-            if buffer:
-                width += pdfmetrics.stringWidth(buffer, text_font, font_size)
-                buffer = ""
-            width += pdfmetrics.stringWidth(ch, emoji_font, font_size)
-        else:
-            buffer += ch
+def shrink_thumbnail(data: bytes, max_px: int = THUMB_MAX_PX, quality: int = 75) -> bytes | None:
+    """
+    Downscale image bytes to at most max_px tall and re-encode as JPEG
+    (transparent areas become white). Only the height is bounded (width up
+    to 4x), since draw_thumbnail sizes by height and caps it at the pixel
+    height. Returns None if the data cannot be decoded as an image.
+    """
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.thumbnail((max_px * 4, max_px), Image.LANCZOS)
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, "white")
+            background.paste(img, mask=img.getchannel("A"))
+            img = background
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=quality, optimize=True)
+        return out.getvalue()
+    except Exception as e:
+        print(f"[thumb] Not a usable image: {e}")
+        return None
 
-    # flush buffer end
-    if buffer:
-        width += pdfmetrics.stringWidth(buffer, text_font, font_size)
+# Most news pages put og:image in a plain <meta property=... content=...> tag,
+# which a regex finds without building a parse tree
+META_OG_RE = re.compile(
+    rb'<meta[^>]+property=["\']og:image["\'][^>]+content=["\']([^"\']+)', re.I
+)
 
-    return width
+# lxml parses large pages much faster; fall back if it is not installed
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
 
+@functools.lru_cache(maxsize=256)
 def get_thumbnail_url(page_url: str, timeout: float = 5.0) -> str | None:
     """
     Try to fetch a representative thumbnail image for a web page.
@@ -287,18 +503,17 @@ def get_thumbnail_url(page_url: str, timeout: float = 5.0) -> str | None:
       4. /favicon.ico as last resort
     Returns absolute image URL or None.
     """
-    headers = {
-        "User-Agent": "Mozilla/5.0 (compatible; WeatherNewsBot/1.0)"
-    }
-
     try:
-        resp = requests.get(page_url, headers=headers, timeout=timeout)
-        resp.raise_for_status()
+        page = fetch_cached(page_url, timeout=timeout)
     except Exception as e:
         print(f"[thumb] Failed to fetch page {page_url}: {e}")
         return None
 
-    soup = BeautifulSoup(resp.text, "html.parser")
+    m = META_OG_RE.search(page)
+    if m:
+        return urljoin(page_url, html.unescape(m.group(1).decode("utf-8", "replace")))
+
+    soup = BeautifulSoup(page, HTML_PARSER)
 
     # 1. og:image
     og = soup.find("meta", property="og:image")
@@ -311,33 +526,58 @@ def get_thumbnail_url(page_url: str, timeout: float = 5.0) -> str | None:
         return urljoin(page_url, tw["content"])
 
 
-def draw_thumbnail_from_url(c,
-                            image_url: str,
-                            link_url: str,                            
-                            x: float,
-                            y: float,
-                            size: float = 10,
-                            timeout: float = 5.0):
+def fetch_thumbnail(page_url: str, timeout: float = 5.0):
     """
-    Download an image and draw it at (x, y) with a square size.
-    (x, y) = lower-left corner.
+    Resolve and download the thumbnail for a source page.
+    Returns (thumb_url, image_bytes); either may be None.
     """
-    if not image_url:
-        return
-
-    headers = {
-        "User-Agent": "Mozilla/5.0 (compatible; WeatherNewsBot/1.0)"
-    }
-
+    thumb_url = get_thumbnail_url(page_url, timeout=timeout)
+    if not thumb_url:
+        return None, None
     try:
-        resp = requests.get(image_url, headers=headers, timeout=timeout)
-        resp.raise_for_status()
+        return thumb_url, fetch_cached(thumb_url, timeout=timeout, transform=shrink_thumbnail)
     except Exception as e:
-        print(f"[thumb] Failed to download image {image_url}: {e}")
+        print(f"[thumb] Failed to download image {thumb_url}: {e}")
+        return thumb_url, None
+
+def prefetch_source_thumbnails(tokens: list, max_workers: int = 8) -> dict:
+    """
+    Collect the first link of every bullet in the "📚 Real Sources" section
+    (from classify_line tokens)
+    and fetch their thumbnails in parallel, so the render loop does not wait
+    on one page/image round trip after another.
+    Returns {link_url: (thumb_url, image_bytes)}.
+    """
+    urls = []
+    in_sources_section = False
+    for kind, payload in tokens:
+        if kind == "sources":
+            in_sources_section = True
+        elif in_sources_section and kind == "bullet":
+            m = MD_LINK_RE.search(payload)
+            if m and m.group(2) not in urls:
+                urls.append(m.group(2))
+
+    if not urls:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as ex:
+        return dict(zip(urls, ex.map(fetch_thumbnail, urls)))
+
+def draw_thumbnail(c,
+                   img_data: bytes,
+                   link_url: str,
+                   x: float,
+                   y: float,
+                   size: float = 10):
+    """
+    Draw already-downloaded image bytes at (x, y) with a square size.
+    (x, y) = lower-left corner.
+    """
+    if not img_data:
         return
 
     try:
-        img_bytes = io.BytesIO(resp.content)
+        img_bytes = io.BytesIO(img_data)
         img_reader = ImageReader(img_bytes)
         w, h = img_reader.getSize()
         if size > h:
@@ -364,16 +604,34 @@ def draw_thumbnail_from_url(c,
                 relative=0
             )                                
     except Exception as e:
-        print(f"[thumb] Failed to draw image {image_url}: {e}")
+        print(f"[thumb] Failed to draw image for {link_url}: {e}")
         return
         
 def generate_weather_news_pdf_from_markdown(content_md: str,
-                                            base_utc: datetime | None = None) -> bytes:
+                                            base_utc: datetime | None = None,
+                                            dest_path: str | None = None) -> bytes | None:
+    """
+    Render the news markdown to a PDF. With `dest_path` the canvas saves
+    straight to that file and None is returned; otherwise the PDF bytes
+    are returned. A `dest_path` rendered earlier from the same markdown
+    (sha256 in the `.hash` sidecar) is left as is.
+    """
     if base_utc is None:
         base_utc = datetime.utcnow()
 
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
+    if dest_path:
+        content_hash = hashlib.sha256(content_md.encode("utf-8")).hexdigest()
+        hash_path = dest_path + ".hash"
+        try:
+            with open(hash_path, "r", encoding="ascii") as f:
+                if os.path.exists(dest_path) and f.read().strip() == content_hash:
+                    print(f"📄 Same news as the existing PDF, not re-rendering: {dest_path}")
+                    return None
+        except OSError:
+            pass
+
+    buffer = None if dest_path else io.BytesIO()
+    c = canvas.Canvas(dest_path or buffer, pagesize=A4)
 
     width, height = A4
     margin_left = 20 * mm
@@ -420,25 +678,29 @@ def generate_weather_news_pdf_from_markdown(content_md: str,
     y = height - header_height - 10 * mm
 
     # ------------------------------------
-    # text wrapping
+    # text wrapping (by rendered width)
     # ------------------------------------
-    max_chars_per_line = 55
-    wrapper = textwrap.TextWrapper(width=max_chars_per_line)
+    text_width_max = width - margin_left - margin_right
+    bullet_indent = 4 * mm
+    bullet_prefix_w = measure_text_width("• ", KOREAN_FONT_NAME, EMOJI_FONT_NAME, 11)
 
     in_sources_section = False  # flag when inside "📚 Real Sources"
 
-    for raw_line in content_md.splitlines():
-        line = raw_line.rstrip("\n")
+    # Fetch every source thumbnail up front, in parallel
+    # Classify every line once; the prefetch and the render loop share it
+    tokens = [classify_line(line) for line in content_md.splitlines()]
+    thumbnails = prefetch_source_thumbnails(tokens)
 
+    for kind, payload in tokens:
         # Horizontal rule / blank → small space
-        if line.strip() == "" or line.strip() == "---":
+        if kind == "space":
             y -= line_height * 0.7
             continue
 
         # --------------------------------------------------
         # “📚 Real Sources” heading → styled section label
         # --------------------------------------------------
-        if line.strip().startswith("**📚") and "Real Sources" in line:
+        if kind == "sources":
             in_sources_section = True
 
             # space before section
@@ -448,7 +710,7 @@ def generate_weather_news_pdf_from_markdown(content_md: str,
                 y = height - margin_top
 
             # draw label with accent color
-            label_text = line.strip().strip("*")  # remove **…**
+            label_text = payload  # **…** already removed
             c.setFillColorRGB(0.15, 0.35, 0.65)  # bluish
             draw_markdown_line_with_links(
                 c,
@@ -466,83 +728,69 @@ def generate_weather_news_pdf_from_markdown(content_md: str,
         # --------------------------------------------------
         # H2-style headlines: any line that contains **bold**
         # --------------------------------------------------
-        if "**" in line:
-            # If there's at least one bold segment, treat the WHOLE line as H2.
-            # Remove all **...** markers for rendering.
-            if re.search(r"\*\*(.+?)\*\*", line):
-                headline_text = re.sub(r"\*\*(.+?)\*\*", r"\1", line).strip()
-            else:
-                headline_text = line.strip()
+        if kind == "h2":
+            headline_text = payload
 
-            if headline_text:
-                # spacing before headline
-                y -= line_height * 0.5
-                if y < margin_bottom:
-                    c.showPage()
-                    y = height - margin_top
+            # spacing before headline
+            y -= line_height * 0.5
+            if y < margin_bottom:
+                c.showPage()
+                y = height - margin_top
 
-                h2_font_size = 13
+            h2_font_size = 13
 
-                # Wrap headline in case it’s long
-                h2_segments = wrapper.wrap(headline_text) or [""]
+            # Wrap headline in case it’s long
+            h2_segments = wrap_by_width(
+                headline_text, text_width_max,
+                KOREAN_FONT_NAME, EMOJI_FONT_NAME, h2_font_size,
+            ) or [""]
 
-                for seg in h2_segments:
-                    # Height of this H2 bar
-                    pad_x = 4 * mm
-                    pad_y = 1.5 * mm
-                    rect_h = h2_font_size + pad_y * 2
+            for seg in h2_segments:
+                # Height of this H2 bar
+                pad_x = 4 * mm
+                pad_y = 1.5 * mm
+                rect_h = h2_font_size + pad_y * 2
 
-                    # Page break if needed
-                    if y - rect_h < margin_bottom:
-                        c.showPage()
-                        y = height - margin_top
+                # Page break if needed
+                if y - rect_h < margin_bottom:
+                    c.showPage()
+                    y = height - margin_top
 
-                    # Measure visible text width (Korean + emoji aware)
-                    text_width = measure_text_width(
-                        seg,
-                        text_font=KOREAN_FONT_NAME,
-                        emoji_font=EMOJI_FONT_NAME,
-                        font_size=h2_font_size,
-                    )
+                # Tokenize once; the same pieces give the bar width
+                # (Korean + emoji aware, link titles only) and are drawn
+                pieces = tokenize_line(seg, KOREAN_FONT_NAME, EMOJI_FONT_NAME)
+                text_width = pieces_width(pieces, h2_font_size)
 
-                    # Background rectangle geometry
-                    rect_x = margin_left - pad_x
-                    rect_y = y - pad_y
-                    rect_w = text_width + pad_x * 2
+                # Background rectangle geometry
+                rect_x = margin_left - pad_x
+                rect_y = y - pad_y
+                rect_w = text_width + pad_x * 2
 
-                    # Draw background bar
-                    c.setFillColorRGB(0.90, 0.95, 1.00)  # light blue
-                    c.roundRect(rect_x, rect_y, rect_w, rect_h, radius=2 * mm,
-                                stroke=0, fill=1)
+                # Draw background bar
+                c.setFillColorRGB(0.90, 0.95, 1.00)  # light blue
+                c.roundRect(rect_x, rect_y, rect_w, rect_h, radius=2 * mm,
+                            stroke=0, fill=1)
 
-                    # Draw headline text on top
-                    c.setFillColorRGB(0.1, 0.1, 0.1)    # dark text
-                    draw_markdown_line_with_links(
-                        c,
-                        margin_left,
-                        y,
-                        seg,
-                        text_font=KOREAN_FONT_NAME,
-                        emoji_font=EMOJI_FONT_NAME,
-                        font_size=h2_font_size,
-                    )
+                # Draw headline text on top
+                c.setFillColorRGB(0.1, 0.1, 0.1)    # dark text
+                render_pieces(c, margin_left, y, pieces, h2_font_size)
 
-                    y -= rect_h + line_height * 0.2
+                y -= rect_h + line_height * 0.2
 
-                # Reset to body text color
-                c.setFillColorRGB(0, 0, 0)
-                y -= line_height * 0.1
-                continue
+            # Reset to body text color
+            c.setFillColorRGB(0, 0, 0)
+            y -= line_height * 0.1
+            continue
 
         # --------------------------------------------------
         # Bullet list: - item / * item
         # --------------------------------------------------
-        bullet_match = re.match(r"^\s*[-*]\s+(.*)$", line)
-        if bullet_match:
-            text = bullet_match.group(1)
+        if kind == "bullet":
+            text = payload
 
             # If the bullet has a markdown link, avoid wrapping to keep URL hidden.
-            if re.search(r'\[([^\]]+)\]\(([^)]+)\)', text):
+            link_match = MD_LINK_RE.search(text)
+            if link_match:
                 if y < margin_bottom:
                     c.showPage()
                     y = height - margin_top
@@ -553,11 +801,11 @@ def generate_weather_news_pdf_from_markdown(content_md: str,
                 # If we are in the Real Sources section, we’ll try to draw a thumbnail.
                 if in_sources_section:
                     # Extract the first [title](url) from the bullet
-                    m = re.search(r'\[([^\]]+)\]\(([^)]+)\)', text)
-                    thumb_url = None
+                    m = link_match
+                    thumb_url, thumb_data = None, None
                     if m:
                         _, link_url = m.groups()
-                        thumb_url = get_thumbnail_url(link_url)
+                        thumb_url, thumb_data = thumbnails.get(link_url, (None, None))
 
                     thumb_size = 120  # pt
                     #thumb_margin = 6  # space between thumb and text
@@ -568,9 +816,9 @@ def generate_weather_news_pdf_from_markdown(content_md: str,
                     thumb_y = y - (thumb_size * 1.0) - 5
 
                     if thumb_url:
-                        draw_thumbnail_from_url(
+                        draw_thumbnail(
                             c,
-                            thumb_url,
+                            thumb_data,
                             link_url,
                             x=thumb_x + 10,
                             y=thumb_y,
@@ -611,7 +859,10 @@ def generate_weather_news_pdf_from_markdown(content_md: str,
 
             else:
                 # bullet without link → normal wrapping
-                wrapped = wrapper.wrap(text) or [""]
+                wrapped = wrap_by_width(
+                    text, text_width_max - bullet_indent - bullet_prefix_w,
+                    KOREAN_FONT_NAME, EMOJI_FONT_NAME, 11,
+                ) or [""]
                 for i, seg in enumerate(wrapped):
                     if y < margin_bottom:
                         c.showPage()
@@ -633,7 +884,34 @@ def generate_weather_news_pdf_from_markdown(content_md: str,
         # --------------------------------------------------
         # Normal paragraph line (may include links + emoji)
         # --------------------------------------------------
-        for seg in wrapper.wrap(line) or [""]:
+        line = payload
+        segments = wrap_by_width(line, text_width_max,
+                                 KOREAN_FONT_NAME, EMOJI_FONT_NAME, 11) or [""]
+
+        # Plain text (no links, no emoji): all wrapped lines go into one
+        # text object, stepping down by the leading
+        if not MD_LINK_RE.search(line) and not EMOJI_RUN_RE.search(line):
+            text_obj = None
+            for seg in segments:
+                if y < margin_bottom:
+                    if text_obj is not None:
+                        c.drawText(text_obj)
+                        text_obj = None
+                    c.showPage()
+                    y = height - margin_top
+
+                if text_obj is None:
+                    text_obj = c.beginText(margin_left, y)
+                    text_obj.setFont(KOREAN_FONT_NAME, 11)
+                    text_obj.setLeading(line_height)
+                text_obj.textLine(seg)
+                y -= line_height
+
+            if text_obj is not None:
+                c.drawText(text_obj)
+            continue
+
+        for seg in segments:
             if y < margin_bottom:
                 c.showPage()
                 y = height - margin_top
@@ -652,17 +930,30 @@ def generate_weather_news_pdf_from_markdown(content_md: str,
     c.showPage()
     c.save()
 
+    if buffer is None:
+        try:
+            with open(hash_path, "w", encoding="ascii") as f:
+                f.write(content_hash)
+        except OSError as e:
+            print(f"Failed to write PDF hash: {e}")
+        return None
     pdf_bytes = buffer.getvalue()
     buffer.close()
     return pdf_bytes
 
 if __name__ == "__main__":
-    news_update = get_weather_news()
+    news_update = get_weather_news_cached()
     #print(news_update)
-    if news_update:
-        post_to_discord(news_update)         
     base_utc, ymd, hhh = get_base_time_strings()     
     pdf_filename = f"Daily_Weather_News_{base_utc.strftime('%Y%m%d_00UTC')}_Gemini.pdf"
-    with open(pdf_filename, "wb") as f:
-        f.write(generate_weather_news_pdf_from_markdown(news_update))
-    print(f"✅ PDF saved: {pdf_filename}")      
\ No newline at end of file
+
+    # The PDF (thumbnail fetches + rendering) does not depend on the
+    # Discord post, so build it in the background while posting
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        pdf_future = ex.submit(
+            generate_weather_news_pdf_from_markdown, news_update, dest_path=pdf_filename
+        )
+        if news_update:
+            post_to_discord(news_update)
+        pdf_future.result()
+    print(f"✅ PDF saved: {pdf_filename}")      